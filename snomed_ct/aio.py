@@ -0,0 +1,109 @@
+from __future__ import unicode_literals
+import asyncio
+import functools
+import weakref
+
+from . import hierarchy, terms
+from .metrics import instrumented
+from .models import TermBasedView
+
+try:
+    from asgiref.sync import sync_to_async
+except ImportError:
+    sync_to_async = None
+
+_loaders = weakref.WeakKeyDictionary()
+
+
+async def run_sync(func, *args, **kwargs):
+    if sync_to_async is not None:
+        return await sync_to_async(func, thread_sensitive=True)(*args, **kwargs)
+    return await asyncio.get_event_loop().run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+class BatchLoader(object):
+    """
+    DataLoader pattern: keys requested within the same event loop tick are deduplicated and resolved by
+    a single call of batch_function, which takes a list of keys and returns a dict. Keys are converted by
+    key_function before batching, so an invalid key fails only the future of its caller.
+    """
+
+    def __init__(self, batch_function, loop, key_function=None):
+        self.batch_function = batch_function
+        self.loop = loop
+        self.key_function = key_function
+        self.pending = {}
+
+    def load(self, key):
+        if self.key_function is not None:
+            try:
+                key = self.key_function(key)
+            except (TypeError, ValueError) as e:
+                future = self.loop.create_future()
+                future.set_exception(e)
+                return future
+
+        future = self.pending.get(key)
+        if future is None:
+            if not self.pending:
+                self.loop.call_soon(self.dispatch)
+            future = self.pending[key] = self.loop.create_future()
+        return future
+
+    async def load_many(self, keys):
+        return await asyncio.gather(*[self.load(key) for key in keys])
+
+    def dispatch(self):
+        pending, self.pending = self.pending, {}
+        self.loop.create_task(self.resolve(pending))
+
+    async def resolve(self, pending):
+        try:
+            results = await run_sync(self.batch_function, list(pending))
+        except Exception as e:
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for key, future in pending.items():
+            if not future.done():
+                future.set_result(results.get(key))
+
+
+def get_loader(batch_function, **kwargs):
+    loop = asyncio.get_event_loop()
+    loaders = _loaders.setdefault(loop, {})
+    key = (batch_function, tuple(sorted(kwargs.items())))
+    if key not in loaders:
+        loaders[key] = BatchLoader(functools.partial(batch_function, **kwargs), loop, key_function=int)
+    return loaders[key]
+
+
+async def get_preferred_term(concept_id, lang='en_us'):
+    return await get_loader(terms.get_preferred_terms, lang=lang).load(concept_id)
+
+
+async def get_fully_specified_name(concept_id, lang='en_us'):
+    return await get_loader(terms.get_fully_specified_names, lang=lang).load(concept_id)
+
+
+async def get_parents(concept_id):
+    return await get_loader(hierarchy.get_parents).load(concept_id) or set()
+
+
+async def get_children(concept_id):
+    return await get_loader(hierarchy.get_children).load(concept_id) or set()
+
+
+async def get_ancestors(concept_id):
+    return await get_loader(hierarchy.get_ancestors).load(concept_id) or set()
+
+
+@instrumented('aio.search')
+def _search(query, limit):
+    return list(TermBasedView.objects.search(query)[:limit])
+
+
+async def search(query, limit=20):
+    return await run_sync(_search, query, limit)
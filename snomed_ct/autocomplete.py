@@ -0,0 +1,149 @@
+from __future__ import unicode_literals
+import heapq
+import pickle
+from array import array
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+
+from django.db import router
+
+from .models import Concept, Description, LangRefSet
+from .utils import stream_query, tokenise
+
+# Same ordering as get_priority() database function and default ts_rank weights: FSN (B), preferred term (C),
+# other synonyms (D)
+FULLY_SPECIFIED_NAME_WEIGHT = 0.4
+PREFERRED_TERM_WEIGHT = 0.2
+SYNONYM_WEIGHT = 0.1
+
+Suggestion = namedtuple('Suggestion', ('concept_id', 'term', 'weight'))
+
+
+def get_priority_weight(type_id, acceptability_id):
+    if type_id == Description.TYPE_CHOICES.fully_specified_name:
+        return FULLY_SPECIFIED_NAME_WEIGHT
+    elif acceptability_id == LangRefSet.ACCEPTABILITY_CHOICES.preferred:
+        return PREFERRED_TERM_WEIGHT
+    return SYNONYM_WEIGHT
+
+
+class AutocompleteIndex(object):
+    """
+    In-process autocomplete over active descriptions of one language reference set.
+
+    Descriptions are numbered in ranking order (weight, then term length), so every token posting list is
+    an ascending array of description numbers and best matches come first when postings are merged.
+    Prefixes matching many tokens have their merged postings precomputed.
+    """
+
+    def __init__(self, descriptions, prefix_cache_threshold=64, prefix_cache_size=2000):
+        # descriptions: iterable of (concept_id, term, weight)
+        descriptions = sorted(descriptions, key=lambda description: (-description[2], len(description[1])))
+        self.concept_ids = array('q', (description[0] for description in descriptions))
+        self.terms = [description[1] for description in descriptions]
+        self.weights = array('d', (description[2] for description in descriptions))
+
+        postings = defaultdict(lambda: array('I'))
+        description_tokens = []
+        for i, term in enumerate(self.terms):
+            tokens = sorted(set(tokenise(term)))
+            description_tokens.append(tokens)
+            for token in tokens:
+                postings[token].append(i)
+
+        self.tokens = sorted(postings)
+        self.postings = [postings[token] for token in self.tokens]
+        token_ids = dict((token, i) for i, token in enumerate(self.tokens))
+        self.description_tokens = [array('I', (token_ids[token] for token in tokens))
+                                   for tokens in description_tokens]
+
+        self.prefix_cache = {}
+        self.prefix_cache_size = prefix_cache_size
+        for token in self.tokens:
+            for length in range(1, len(token) + 1):
+                prefix = token[:length]
+                if prefix in self.prefix_cache:
+                    continue
+                lo, hi = self.token_range(prefix)
+                if hi - lo < prefix_cache_threshold:
+                    break
+                self.prefix_cache[prefix] = array('I', self.__merge(lo, hi, prefix_cache_size))
+
+    @classmethod
+    def from_database(cls, lang='en_us', using=None, **kwargs):
+        rows = stream_query("""
+            SELECT d.concept_id, d.term, d.type_id, l.acceptability_id
+            FROM sct2_lang_refset l
+              JOIN sct2_description d ON d.id = l.referenced_component_id
+              JOIN sct2_concept c ON c.id = d.concept_id
+            WHERE l.active = TRUE AND d.active = TRUE AND c.active = TRUE AND l.refset_id = %s;
+        """, [getattr(LangRefSet.REFSET_CHOICES, lang)], using=using or router.db_for_read(Concept))
+        return cls(((concept_id, term, get_priority_weight(type_id, acceptability_id))
+                    for concept_id, term, type_id, acceptability_id in rows), **kwargs)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as index_file:
+            return pickle.load(index_file)
+
+    def save(self, path):
+        with open(path, 'wb') as index_file:
+            pickle.dump(self, index_file, pickle.HIGHEST_PROTOCOL)
+
+    def token_range(self, prefix):
+        return bisect_left(self.tokens, prefix), bisect_left(self.tokens, prefix + '\uffff')
+
+    def __merge(self, lo, hi, limit=None):
+        merged = heapq.merge(*self.postings[lo:hi])
+        previous, count = None, 0
+        for i in merged:
+            if i == previous:
+                continue
+            # Only unique numbers count towards the limit, so a shorter cached list is always complete
+            if limit is not None and count >= limit:
+                return
+            yield i
+            previous, count = i, count + 1
+
+    def __candidates(self, prefix):
+        lo, hi = self.token_range(prefix)
+        cached = self.prefix_cache.get(prefix)
+        if cached is None:
+            return self.__merge(lo, hi)
+        if len(cached) < self.prefix_cache_size:
+            return iter(cached)
+        # Cache holds only the best descriptions, continue with full merge once it is exhausted
+        return self.__continue(cached, lo, hi)
+
+    def __continue(self, cached, lo, hi):
+        for i in cached:
+            yield i
+        for i in self.__merge(lo, hi):
+            if i > cached[-1]:
+                yield i
+
+    def search(self, query, limit=10):
+        tokens = tokenise(query)
+        if not tokens:
+            return []
+
+        # Drive the search by the most selective prefix, check the others against description tokens
+        ranges = sorted((self.token_range(token), token) for token in tokens)
+        ranges.sort(key=lambda item: item[0][1] - item[0][0])
+        (lo, hi), driver = ranges[0]
+        if lo == hi:
+            return []
+        filters = [token_range for token_range, token in ranges[1:]]
+
+        suggestions, seen = [], set()
+        for i in self.__candidates(driver):
+            concept_id = self.concept_ids[i]
+            if concept_id in seen:
+                continue
+            description_tokens = self.description_tokens[i]
+            if all(any(f_lo <= t < f_hi for t in description_tokens) for f_lo, f_hi in filters):
+                seen.add(concept_id)
+                suggestions.append(Suggestion(concept_id, self.terms[i], self.weights[i]))
+                if len(suggestions) >= limit:
+                    break
+        return suggestions
@@ -0,0 +1,144 @@
+from __future__ import unicode_literals
+
+from collections import namedtuple
+
+from django.db import connections, router
+
+from .hierarchy import IS_A_CONDITION
+from .models import Concept, Description, LangRefSet
+from .rf2 import discover_release_date, get_copy_sql, get_file_path, get_rf2_file
+from .utils import stream_query
+
+DIFF_TABLES = ('sct2_concept', 'sct2_description', 'sct2_lang_refset', 'sct2_relationship')
+
+CONCEPT_ADDED = 'concept_added'
+CONCEPT_REMOVED = 'concept_removed'
+CONCEPT_INACTIVATED = 'concept_inactivated'
+CONCEPT_REACTIVATED = 'concept_reactivated'
+DEFINITION_STATUS_CHANGED = 'definition_status_changed'
+PREFERRED_TERM_CHANGED = 'preferred_term_changed'
+FULLY_SPECIFIED_NAME_CHANGED = 'fully_specified_name_changed'
+PARENTS_CHANGED = 'parents_changed'
+
+CATEGORIES = (CONCEPT_ADDED, CONCEPT_REMOVED, CONCEPT_INACTIVATED, CONCEPT_REACTIVATED, DEFINITION_STATUS_CHANGED,
+              PREFERRED_TERM_CHANGED, FULLY_SPECIFIED_NAME_CHANGED, PARENTS_CHANGED)
+
+Change = namedtuple('Change', ('concept_id', 'category', 'old_value', 'new_value'))
+
+DIFF_SQL = """
+    WITH old_concept AS (
+        SELECT c.id, c.active, c.definition_status_id FROM {old_sct2_concept} c WHERE {concept_filter}
+    ), new_concept AS (
+        SELECT c.id, c.active, c.definition_status_id FROM {new_sct2_concept} c WHERE {concept_filter}
+    ), old_term AS (
+        SELECT d.concept_id, d.type_id, d.term
+        FROM {old_sct2_description} d
+          JOIN {old_sct2_lang_refset} l ON l.referenced_component_id = d.id
+        WHERE d.active = TRUE AND l.active = TRUE AND l.refset_id = %(refset)s AND
+              l.acceptability_id = %(preferred)s AND {description_filter}
+    ), new_term AS (
+        SELECT d.concept_id, d.type_id, d.term
+        FROM {new_sct2_description} d
+          JOIN {new_sct2_lang_refset} l ON l.referenced_component_id = d.id
+        WHERE d.active = TRUE AND l.active = TRUE AND l.refset_id = %(refset)s AND
+              l.acceptability_id = %(preferred)s AND {description_filter}
+    ), old_parents AS (
+        SELECT r.source_id AS concept_id, array_agg(r.destination_id ORDER BY r.destination_id) AS parents
+        FROM {old_sct2_relationship} r
+        WHERE {is_a} AND {relationship_filter}
+        GROUP BY r.source_id
+    ), new_parents AS (
+        SELECT r.source_id AS concept_id, array_agg(r.destination_id ORDER BY r.destination_id) AS parents
+        FROM {new_sct2_relationship} r
+        WHERE {is_a} AND {relationship_filter}
+        GROUP BY r.source_id
+    ), common_concept AS (
+        SELECT o.id FROM old_concept o JOIN new_concept n ON n.id = o.id
+    )
+    SELECT n.id, %(concept_added)s, NULL, NULL
+    FROM new_concept n LEFT JOIN old_concept o ON o.id = n.id
+    WHERE o.id IS NULL
+    UNION ALL
+    SELECT o.id, %(concept_removed)s, NULL, NULL
+    FROM old_concept o LEFT JOIN new_concept n ON n.id = o.id
+    WHERE n.id IS NULL
+    UNION ALL
+    SELECT o.id, CASE WHEN n.active THEN %(concept_reactivated)s ELSE %(concept_inactivated)s END, NULL, NULL
+    FROM old_concept o JOIN new_concept n ON n.id = o.id
+    WHERE o.active <> n.active
+    UNION ALL
+    SELECT o.id, %(definition_status_changed)s, o.definition_status_id :: TEXT, n.definition_status_id :: TEXT
+    FROM old_concept o JOIN new_concept n ON n.id = o.id
+    WHERE o.definition_status_id <> n.definition_status_id
+    UNION ALL
+    SELECT cc.id,
+      CASE coalesce(o.type_id, n.type_id) WHEN %(fully_specified_name)s THEN %(fully_specified_name_changed)s
+                                          ELSE %(preferred_term_changed)s END,
+      o.term, n.term
+    FROM old_term o
+      FULL JOIN new_term n ON n.concept_id = o.concept_id AND n.type_id = o.type_id
+      JOIN common_concept cc ON cc.id = coalesce(o.concept_id, n.concept_id)
+    WHERE o.term IS DISTINCT FROM n.term
+    UNION ALL
+    SELECT cc.id, %(parents_changed)s, array_to_string(o.parents, ','), array_to_string(n.parents, ',')
+    FROM old_parents o
+      FULL JOIN new_parents n ON n.concept_id = o.concept_id
+      JOIN common_concept cc ON cc.id = coalesce(o.concept_id, n.concept_id)
+    WHERE o.parents IS DISTINCT FROM n.parents
+    ORDER BY 1, 2;
+"""
+
+
+def load_incoming_release(location, table_name='incoming_%s', using=None):
+    """
+    Copies concept, description, language refset and relationship files of RF2 release at location into
+    temporary tables, which live until the end of the current session.
+    """
+    using = using or router.db_for_write(Concept)
+    release_date = discover_release_date(location)
+    with connections[using].cursor() as cursor:
+        for table in DIFF_TABLES:
+            cursor.execute("""
+            DROP TABLE IF EXISTS pg_temp.%(name)s;
+            CREATE TEMPORARY TABLE %(name)s (LIKE %(table)s);
+            """ % {'name': table_name % table, 'table': table})
+            rf2_file = get_rf2_file(table)
+            cursor.execute(get_copy_sql(rf2_file, table_name % table), [get_file_path(rf2_file, location, release_date)])
+            cursor.execute("""ANALYZE %s;""" % (table_name % table))
+    return release_date
+
+
+def release_diff(old='%s', new='%s', codes=None, lang='en_us', using=None, chunk_size=10000):
+    """
+    Streams categorised changes between two releases as Change tuples ordered by concept id. Releases are given
+    as table name templates, e.g. old='snomed_ct_20260301.%s' for a release loaded into another schema or
+    new='incoming_%s' for one loaded by load_incoming_release(). The loaded tables are used by default.
+    """
+    tables = {}
+    for table in DIFF_TABLES:
+        tables['old_%s' % table] = old % table
+        tables['new_%s' % table] = new % table
+
+    params = {
+        'refset': getattr(LangRefSet.REFSET_CHOICES, lang),
+        'preferred': LangRefSet.ACCEPTABILITY_CHOICES.preferred,
+        'fully_specified_name': Description.TYPE_CHOICES.fully_specified_name,
+    }
+    for category in CATEGORIES:
+        params[category] = category
+
+    if codes is None:
+        filters = dict.fromkeys(('concept_filter', 'description_filter', 'relationship_filter'), 'TRUE')
+    else:
+        params['codes'] = [int(code) for code in codes]
+        filters = {
+            'concept_filter': 'c.id = ANY (%(codes)s :: BIGINT [])',
+            'description_filter': 'd.concept_id = ANY (%(codes)s :: BIGINT [])',
+            'relationship_filter': 'r.source_id = ANY (%(codes)s :: BIGINT [])',
+        }
+    filters.update(tables)
+
+    rows = stream_query(DIFF_SQL.format(is_a=IS_A_CONDITION, **filters), params,
+                        using=using or router.db_for_read(Concept), chunk_size=chunk_size)
+    for row in rows:
+        yield Change(*row)
@@ -1,3 +1,9 @@
 
 
 class SNOMEDCTModelOperationNotPermitted(Exception): pass
+
+
+class SNOMEDCTReleaseError(Exception): pass
+
+
+class SNOMEDCTExpressionError(ValueError): pass
@@ -0,0 +1,260 @@
+from __future__ import unicode_literals
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from django.db import router
+
+from .exceptions import SNOMEDCTExpressionError
+from .hierarchy import get_ancestors
+from .models import Concept, Relationship
+from .utils import is_valid_sctid
+
+EQUIVALENT_TO = '==='
+SUBTYPE_OF = '<<<'
+
+Expression = namedtuple('Expression', ('definition_status', 'focus_concepts', 'attributes', 'groups'))
+Attribute = namedtuple('Attribute', ('type_id', 'value'))
+
+TOKEN_RE = re.compile(r"""
+    \s*(?:
+      (?P<status>===|<<<)
+    | (?P<id>\d{6,18})
+    | \|(?P<term>[^|]*)\|
+    | \#(?P<number>[+-]?\d+(?:\.\d+)?)
+    | "(?P<string>(?:[^"\\]|\\.)*)"
+    | (?P<symbol>[:=,+{}()])
+    )""", re.VERBOSE)
+
+
+class _Parser(object):
+    """
+    Recursive descent parser of SNOMED CT compositional grammar, terms are accepted and ignored.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = []
+        position = 0
+        text = text.rstrip()
+        while position < len(text):
+            match = TOKEN_RE.match(text, position)
+            if not match or match.end() == position:
+                raise SNOMEDCTExpressionError("Unexpected character at position %d of %r." % (position, self.text))
+            kind = match.lastgroup
+            if kind != 'term':
+                self.tokens.append((kind, match.group(kind)))
+            position = match.end()
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self, kind, value=None):
+        token_kind, token_value = self.peek()
+        if token_kind != kind or (value is not None and token_value != value):
+            raise SNOMEDCTExpressionError("Expected %s in %r, got %s." % (value or kind, self.text, token_value))
+        self.position += 1
+        return token_value
+
+    def accept(self, value):
+        if self.peek() == ('symbol', value):
+            self.position += 1
+            return True
+        return False
+
+    def parse(self):
+        status = self.take('status') if self.peek()[0] == 'status' else EQUIVALENT_TO
+        expression = self.sub_expression(status)
+        if self.position != len(self.tokens):
+            raise SNOMEDCTExpressionError("Unexpected %s at the end of %r." % (self.peek()[1], self.text))
+        return expression
+
+    def concept(self):
+        concept_id = self.take('id')
+        if not is_valid_sctid(concept_id):
+            raise SNOMEDCTExpressionError("%s is not a valid concept SCTID." % concept_id)
+        return int(concept_id)
+
+    def sub_expression(self, status=None):
+        focus_concepts = [self.concept()]
+        while self.accept('+'):
+            focus_concepts.append(self.concept())
+
+        attributes, groups = [], []
+        if self.accept(':'):
+            while True:
+                if self.accept('{'):
+                    groups.append(self.attribute_set())
+                    self.take('symbol', '}')
+                else:
+                    attributes.extend(self.attribute_set())
+                # Groups may follow each other without a comma
+                if not self.accept(',') and self.peek() != ('symbol', '{'):
+                    break
+
+        return normalise_parts(status, focus_concepts, attributes, groups)
+
+    def attribute_set(self):
+        attributes = [self.attribute()]
+        while self.peek() == ('symbol', ',') and self.tokens[self.position + 1:self.position + 2] != [('symbol', '{')]:
+            self.position += 1
+            attributes.append(self.attribute())
+        return attributes
+
+    def attribute(self):
+        type_id = self.concept()
+        self.take('symbol', '=')
+        kind, value = self.peek()
+        if kind == 'number':
+            self.position += 1
+            return Attribute(type_id, float(value) if '.' in value else int(value) * 1.0)
+        if kind == 'string':
+            self.position += 1
+            return Attribute(type_id, value.replace('\\"', '"').replace('\\\\', '\\'))
+        if self.accept('('):
+            value = self.sub_expression()
+            self.take('symbol', ')')
+            # Nested expressions of a single concept are the concept itself
+            if not value.attributes and not value.groups and len(value.focus_concepts) == 1:
+                value = value.focus_concepts[0]
+            return Attribute(type_id, value)
+        return Attribute(type_id, self.concept())
+
+
+def _sort_key(attribute):
+    value = attribute.value
+    return attribute.type_id, (0, value, '') if isinstance(value, int) else \
+        (1, 0, format_expression(value)) if isinstance(value, Expression) else (2, 0, repr(value))
+
+
+def normalise_parts(status, focus_concepts, attributes, groups):
+    # Canonical order: ascending focus concepts and attribute types, duplicates removed
+    attributes = tuple(sorted(set(attributes), key=_sort_key))
+    groups = tuple(sorted(set(tuple(sorted(set(group), key=_sort_key)) for group in groups),
+                          key=lambda group: [_sort_key(attribute) for attribute in group]))
+    return Expression(status, tuple(sorted(set(focus_concepts))), attributes, groups)
+
+
+def _format_value(value):
+    if isinstance(value, Expression):
+        return '(%s)' % format_expression(value)
+    if isinstance(value, float):
+        return '#%s' % ('%d' % value if value.is_integer() else repr(value))
+    if isinstance(value, int):
+        return '%d' % value
+    return '"%s"' % value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def format_expression(expression):
+    text = '+'.join('%d' % concept_id for concept_id in expression.focus_concepts)
+    refinements = ['%d=%s' % (attribute.type_id, _format_value(attribute.value)) for attribute in expression.attributes]
+    refinements.extend('{%s}' % ','.join('%d=%s' % (attribute.type_id, _format_value(attribute.value))
+                                         for attribute in group) for group in expression.groups)
+    if refinements:
+        text += ':' + ','.join(refinements)
+    return text
+
+
+@lru_cache(maxsize=10000)
+def parse_expression(text):
+    """
+    Parses compositional grammar expression into normalised Expression. Results are cached by expression
+    text, so repeated expressions of high volume feeds cost a dictionary lookup.
+    """
+    return _Parser(text).parse()
+
+
+@lru_cache(maxsize=10000)
+def normalise_expression(text):
+    """
+    Returns canonical form of the expression: no terms or whitespace, default definition status omitted,
+    focus concepts, attributes and groups in ascending order.
+    """
+    expression = parse_expression(text)
+    normal_form = format_expression(expression)
+    return normal_form if expression.definition_status == EQUIVALENT_TO else SUBTYPE_OF + normal_form
+
+
+def _to_expression(value):
+    if isinstance(value, Expression):
+        return value
+    if isinstance(value, int):
+        return Expression(EQUIVALENT_TO, (value,), (), ())
+    return parse_expression(value)
+
+
+def _concept_ids(expression, types=None):
+    concept_ids = set(expression.focus_concepts)
+    for attribute in expression.attributes + tuple(attribute for group in expression.groups for attribute in group):
+        concept_ids.add(attribute.type_id)
+        if types is not None:
+            types.add(attribute.type_id)
+        if isinstance(attribute.value, Expression):
+            concept_ids |= _concept_ids(attribute.value, types)
+        elif isinstance(attribute.value, int):
+            concept_ids.add(attribute.value)
+    return concept_ids
+
+
+def validate_expression(expression, using=None):
+    """
+    Returns list of problems of the expression: unknown or inactive concepts and attribute types which are
+    not known relationship types. Empty list means the expression is valid.
+    """
+    expression = _to_expression(expression)
+    types = set()
+    concept_ids = _concept_ids(expression, types)
+    active = dict(Concept.objects.using(using or router.db_for_read(Concept)).filter(
+        id__in=concept_ids).values_list('id', 'active'))
+
+    errors = []
+    for concept_id in sorted(concept_ids):
+        if concept_id not in active:
+            errors.append("Concept %d does not exist." % concept_id)
+        elif not active[concept_id]:
+            errors.append("Concept %d is inactive." % concept_id)
+    known_types = {type_id for type_id, _ in Relationship.TYPE_CHOICES}
+    errors.extend("Concept %d is not an attribute type." % type_id for type_id in sorted(types - known_types))
+    return errors
+
+
+def _value_subsumed(value, predicate, closure):
+    if isinstance(value, (int, Expression)) and isinstance(predicate, (int, Expression)):
+        return _subsumed(_to_expression(value), _to_expression(predicate), closure)
+    return value == predicate
+
+
+def _attribute_subsumed(attribute, predicate, closure):
+    return predicate.type_id in closure(attribute.type_id) and \
+        _value_subsumed(attribute.value, predicate.value, closure)
+
+
+def _subsumed(candidate, predicate, closure):
+    if not all(any(focus_id in closure(concept_id) for concept_id in candidate.focus_concepts)
+               for focus_id in predicate.focus_concepts):
+        return False
+
+    # Ungrouped attributes of the predicate can be satisfied by any attribute, groups only by a single group
+    attributes = candidate.attributes + tuple(attribute for group in candidate.groups for attribute in group)
+    if not all(any(_attribute_subsumed(attribute, required, closure) for attribute in attributes)
+               for required in predicate.attributes):
+        return False
+    return all(any(all(any(_attribute_subsumed(attribute, required, closure) for attribute in group)
+                       for required in required_group) for group in candidate.groups)
+               for required_group in predicate.groups)
+
+
+def is_subsumed_by(candidate, predicate, using=None):
+    """
+    Structural subsumption test of expressions, expression strings or concept ids: True when every focus
+    concept, attribute and group of the predicate is matched by a more specific or equal one of the candidate.
+    Definitions of pre-coordinated focus concepts are not expanded.
+    """
+    candidate, predicate = _to_expression(candidate), _to_expression(predicate)
+    ancestors = get_ancestors(_concept_ids(candidate), using)
+
+    def closure(concept_id):
+        return ancestors.get(concept_id, set()) | {concept_id}
+
+    return _subsumed(candidate, predicate, closure)
@@ -0,0 +1,67 @@
+from __future__ import unicode_literals
+
+from collections import defaultdict
+
+from django.db import router
+
+from .metrics import instrumented
+from .models import Relationship
+from .utils import chunked, stream_query
+
+ROOT_CONCEPT_ID = 138875005
+
+IS_A_CONDITION = """r.active = TRUE AND r.type_id = %d AND r.characteristic_type_id <> %d""" % (
+    Relationship.TYPE_CHOICES.is_a, Relationship.CHARACTERISTIC_TYPE_CHOICES.additional)
+
+
+def _group(rows):
+    grouped = defaultdict(set)
+    for concept_id, related_id in rows:
+        grouped[concept_id].add(related_id)
+    return dict(grouped)
+
+
+def _query(sql, concept_ids, using, chunk_size):
+    using = using or router.db_for_read(Relationship)
+    for chunk in chunked(concept_ids, chunk_size):
+        for row in stream_query(sql, [[int(concept_id) for concept_id in chunk]], using=using):
+            yield row
+
+
+@instrumented('hierarchy.get_parents')
+def get_parents(concept_ids, using=None, chunk_size=10000):
+    return _group(_query("""
+        SELECT r.source_id, r.destination_id
+        FROM sct2_relationship r
+        WHERE r.source_id = ANY (%%s :: BIGINT []) AND %s;
+    """ % IS_A_CONDITION, concept_ids, using, chunk_size))
+
+
+@instrumented('hierarchy.get_children')
+def get_children(concept_ids, using=None, chunk_size=10000):
+    return _group(_query("""
+        SELECT r.destination_id, r.source_id
+        FROM sct2_relationship r
+        WHERE r.destination_id = ANY (%%s :: BIGINT []) AND %s;
+    """ % IS_A_CONDITION, concept_ids, using, chunk_size))
+
+
+@instrumented('hierarchy.get_ancestors')
+def get_ancestors(concept_ids, using=None, chunk_size=1000):
+    return _group(_query("""
+        WITH RECURSIVE ancestor(concept_id, ancestor_id) AS (
+            SELECT r.source_id, r.destination_id
+            FROM sct2_relationship r
+            WHERE r.source_id = ANY (%%s :: BIGINT []) AND %s
+            UNION
+            SELECT a.concept_id, r.destination_id
+            FROM ancestor a
+              JOIN sct2_relationship r ON r.source_id = a.ancestor_id AND %s
+        )
+        SELECT concept_id, ancestor_id FROM ancestor;
+    """ % (IS_A_CONDITION, IS_A_CONDITION), concept_ids, using, chunk_size))
+
+
+@instrumented('hierarchy.is_subsumed_by')
+def is_subsumed_by(concept_id, ancestor_id, using=None):
+    return concept_id == ancestor_id or ancestor_id in get_ancestors([concept_id], using).get(concept_id, ())
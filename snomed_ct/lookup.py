@@ -0,0 +1,81 @@
+from __future__ import unicode_literals
+
+from collections import namedtuple
+from uuid import uuid4
+
+from django.db import connections, router, transaction
+
+from .metrics import instrumented
+from .models import Concept, Description, LangRefSet
+from .utils import CopyStream, is_valid_sctid, stream_query
+
+VALID = 'valid'
+INACTIVE = 'inactive'
+UNKNOWN = 'unknown'
+BAD_CHECKSUM = 'bad_checksum'
+
+LookupResult = namedtuple('LookupResult', ('code', 'status', 'concept_id', 'preferred_term'))
+
+
+def _escape_copy_text(value):
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def _lookup_lines(codes):
+    # NumPy arrays are turned into plain python integers at once, which is much faster than per item conversion
+    if hasattr(codes, 'tolist'):
+        codes = codes.tolist()
+
+    for position, code in enumerate(codes):
+        code = str(code).strip()
+        sctid = code if is_valid_sctid(code) else '\\N'
+        yield '%d\t%s\t%s\n' % (position, _escape_copy_text(code), sctid)
+
+
+@instrumented('lookup.bulk_lookup')
+def bulk_lookup(codes, lang='en_us', chunk_size=10000, using=None):
+    """
+    Classifies every code of given iterable (or NumPy array) as valid, inactive, unknown or bad checksum.
+    Results are yielded as LookupResult in the input order, together with the preferred term of valid codes.
+    """
+    # Temporary tables can not be created on hot standby replicas
+    using = using or router.db_for_write(Concept)
+    table_name = 'snomed_ct_lookup_%s' % uuid4().hex
+
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            cursor.execute("""
+            CREATE TEMPORARY TABLE %s(
+              position bigint not null,
+              code text not null,
+              sctid bigint
+            ) ON COMMIT DROP;
+            """ % table_name)
+            cursor.copy_expert("""COPY %s(position, code, sctid) FROM STDIN;""" % table_name,
+                               CopyStream(_lookup_lines(codes)))
+            cursor.execute("""ANALYZE %s;""" % table_name)
+
+        rows = stream_query("""
+            SELECT i.code, i.sctid, c.active, pt.term
+            FROM %s i
+              LEFT JOIN sct2_concept c ON c.id = i.sctid
+              LEFT JOIN (
+                SELECT d.concept_id, d.term
+                FROM sct2_description d
+                  JOIN sct2_lang_refset l ON l.referenced_component_id = d.id
+                WHERE d.active = TRUE AND d.type_id = %%s AND
+                      l.active = TRUE AND l.refset_id = %%s AND l.acceptability_id = %%s
+              ) pt ON pt.concept_id = c.id AND c.active = TRUE
+            ORDER BY i.position;
+            """ % table_name, [Description.TYPE_CHOICES.synonym, getattr(LangRefSet.REFSET_CHOICES, lang),
+                               LangRefSet.ACCEPTABILITY_CHOICES.preferred], using=using, chunk_size=chunk_size)
+
+        for code, sctid, active, term in rows:
+            if sctid is None:
+                yield LookupResult(code, BAD_CHECKSUM, None, None)
+            elif active is None:
+                yield LookupResult(code, UNKNOWN, sctid, None)
+            elif not active:
+                yield LookupResult(code, INACTIVE, sctid, None)
+            else:
+                yield LookupResult(code, VALID, sctid, term)
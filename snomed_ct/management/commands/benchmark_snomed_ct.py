@@ -0,0 +1,237 @@
+from __future__ import unicode_literals
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+
+from ...hierarchy import get_ancestors, get_children, get_parents
+from ...models import (AssociationRefSet, AttributeValueRefSet, ComplexMapRefSet, Concept, Description,
+                       ExtendedMapRefSet, LangRefSet, Relationship, SimpleMapRefSet, SimpleRefSet, StatedRelationship,
+                       TermBasedView, TextDefinition, cache, get_preferred_term_key)
+from ...rf2 import RF2_FILES
+from ...synthetic import SyntheticRelease
+from ...terms import get_preferred_terms
+
+# Misspelled clinical queries with the concept expected among the results
+SEARCH_QUERIES = (
+    ('pnuemonia', 233604007),
+    ('diabetis', 73211009),
+    ('type 2 diabetis', 44054006),
+    ('astma', 195967001),
+    ('hypertenion', 38341003),
+    ('myocardial infraction', 22298006),
+    ('apendicitis', 74400008),
+    ('artheritis', 3723001),
+    ('migrane', 37796009),
+    ('bronchitus', 32398004),
+    ('depresive disorder', 35489007),
+    ('hypothyroidsm', 40930008),
+    ('anaemia', 271737000),
+)
+
+
+MATERIALIZED_VIEWS = ('concept_classification_view', 'terms_based_view', 'concept_summary_view',
+                      'historical_resolution_view')
+
+
+def misspell(term, rng):
+    # Single edit typo: dropped, doubled or swapped letter inside the longest word
+    word = max(term.lower().split(), key=len)
+    if len(word) < 4:
+        return term.lower()
+    position = rng.randint(1, len(word) - 2)
+    typo = rng.choice((
+        word[:position] + word[position + 1:],
+        word[:position] + word[position] + word[position:],
+        word[:position] + word[position + 1] + word[position] + word[position + 2:],
+    ))
+    return term.lower().replace(word, typo, 1)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark SNOMED CT terminology access paths.'
+    suites = ('reads', 'search', 'terms', 'hierarchy', 'view', 'load')
+    default_suites = ('reads', 'search', 'terms', 'hierarchy', 'view')
+    rf2_models = (Concept, Description, TextDefinition, Relationship, StatedRelationship, LangRefSet,
+                  AssociationRefSet, SimpleRefSet, AttributeValueRefSet, SimpleMapRefSet, ComplexMapRefSet,
+                  ExtendedMapRefSet)
+
+    def add_arguments(self, parser):
+        parser.add_argument('suites', nargs='*', choices=self.suites,
+                            help='Suites to run, all but load by default as it replaces loaded data temporarily.')
+        parser.add_argument('--limit', type=int, default=100000, help='Number of rows read per measurement.')
+        parser.add_argument('--repeat', type=int, default=3, help='Number of repetitions, the best one is reported.')
+        parser.add_argument('--top', type=int, default=10, help='Number of search results checked for recall.')
+        parser.add_argument('--sample', type=int, default=0,
+                            help='Search misspelled versions of this many sampled preferred terms instead of the '
+                                 'built in clinical queries, e.g. on synthetic releases.')
+        parser.add_argument('--concepts', type=int, default=1000,
+                            help='Number of sampled concepts used by terms and hierarchy suites.')
+        parser.add_argument('--release', type=str, help='RF2 release loaded by load suite, must be readable by '
+                                                        'the database server.')
+        parser.add_argument('--scale', type=float, default=0.01,
+                            help='Scale of synthetic release generated for load suite when no release is given.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of sampling and synthetic release.')
+        parser.add_argument('--save', type=str, help='JSON file to store results in.')
+        parser.add_argument('--compare', type=str, help='JSON file with earlier results to check for regressions.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Relative slowdown reported as regression, 0.2 by default.')
+        parser.add_argument('--database', type=str, help='Database to use, by default chosen by the router.')
+
+    def handle(self, *args, **options):
+        self.results = {}
+        self.random = random.Random(options['seed'])
+        self.database = options['database'] or router.db_for_read(Concept)
+
+        for suite in options['suites'] or self.default_suites:
+            self.stdout.write(self.style.MIGRATE_HEADING('Benchmarking %s...' % suite))
+            getattr(self, 'benchmark_%s' % suite)(options)
+
+        if options['save']:
+            with open(options['save'], 'w') as results_file:
+                json.dump(self.results, results_file, indent=2, sort_keys=True)
+        if options['compare']:
+            self.compare(options['compare'], options['threshold'])
+
+    def compare(self, location, threshold):
+        with open(location) as results_file:
+            baseline = json.load(results_file)
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Comparing with %s...' % location))
+        regressions = []
+        for name in sorted(set(baseline) & set(self.results)):
+            for metric, value in sorted(self.results[name].items()):
+                old = baseline[name].get(metric)
+                if not old or metric == 'rows':
+                    continue
+                # Recall has to stay, all other metrics are durations
+                regression = value < old if metric == 'recall' else value > old * (1 + threshold)
+                change = (value - old) / old * 100
+                self.stdout.write("  %-40s %-8s %+8.1f%%%s" % (name, metric, change, ' REGRESSION' if regression else ''))
+                if regression:
+                    regressions.append('%s %s' % (name, metric))
+
+        if regressions:
+            raise CommandError("Performance regressions: %s." % ', '.join(regressions))
+
+    def measure(self, name, func, repeat, count=None):
+        timings = []
+        for _ in range(repeat):
+            start = time.time()
+            result = func()
+            timings.append(time.time() - start)
+
+        best = min(timings)
+        count = result if count is None else count
+        self.results[name] = {'seconds': best, 'rows': count}
+        self.stdout.write("  %-40s %10.3fs %14.0f rows/s" % (name, best, count / best if best else 0))
+        return best
+
+    def sample_concepts(self, count):
+        # Sampled by the seeded generator, so that saved and compared runs measure the same concepts
+        concept_ids = list(Concept.objects.using(self.database).filter(active=True).order_by('id')
+                           .values_list('id', flat=True))
+        return self.random.sample(concept_ids, min(count, len(concept_ids)))
+
+    def benchmark_reads(self, options):
+        limit = options['limit']
+        for model in (Concept, Description, Relationship):
+            queryset = model.objects.all()[:limit]
+
+            instances = self.measure('%s instances' % model.__name__,
+                                     lambda: sum(1 for _ in queryset.iterator()), options['repeat'])
+            records = self.measure('%s records' % model.__name__,
+                                   lambda: sum(1 for _ in queryset.records()), options['repeat'])
+
+            if records:
+                self.stdout.write("  %-40s %10.2fx" % ('%s speedup' % model.__name__, instances / records))
+
+    def benchmark_search(self, options):
+        queries = SEARCH_QUERIES
+        if options['sample']:
+            terms = get_preferred_terms(self.sample_concepts(options['sample']))
+            queries = [(misspell(term, self.random), concept_id) for concept_id, term in sorted(terms.items())]
+
+        searches = (
+            ('full text', lambda query: [row.concept_id for row in TermBasedView.objects.search(query)[:options['top']]]),
+            ('fuzzy', lambda query: [row.concept_id for row in TermBasedView.objects.fuzzy_search(
+                query, limit=options['top'])]),
+        )
+        for name, search in searches:
+            latencies, found = [], 0
+            for query, concept_id in queries:
+                for _ in range(options['repeat']):
+                    start = time.time()
+                    concept_ids = search(query)
+                    latencies.append(time.time() - start)
+                found += concept_id in concept_ids
+
+            latencies.sort()
+            result = self.results['%s search' % name] = {
+                'recall': float(found) / len(queries), 'p50': latencies[len(latencies) // 2],
+                'p95': latencies[int(len(latencies) * 0.95)]}
+            self.stdout.write("  %-40s recall@%d %5.2f  p50 %8.2fms  p95 %8.2fms" % (
+                name, options['top'], result['recall'], result['p50'] * 1000, result['p95'] * 1000))
+
+    def benchmark_terms(self, options):
+        concept_ids = self.sample_concepts(options['concepts'])
+        concepts = list(Concept.objects.using(self.database).filter(id__in=concept_ids))
+
+        def cold_preferred_terms():
+            cache.delete_many([get_preferred_term_key(concept.id) for concept in concepts])
+            return sum(1 for concept in concepts if concept.get_preferred_term())
+
+        self.measure('get_preferred_term cold cache', cold_preferred_terms, options['repeat'])
+        self.measure('get_preferred_term warm cache',
+                     lambda: sum(1 for concept in concepts if concept.get_preferred_term()), options['repeat'])
+        self.measure('get_preferred_terms bulk', lambda: len(get_preferred_terms(concept_ids)), options['repeat'])
+
+    def benchmark_hierarchy(self, options):
+        concept_ids = self.sample_concepts(options['concepts'])
+        for name, func in (('parents', get_parents), ('children', get_children), ('ancestors', get_ancestors)):
+            self.measure('%s bulk' % name, lambda: sum(len(ids) for ids in func(concept_ids, self.database).values()),
+                         options['repeat'])
+
+    def benchmark_view(self, options):
+        # Refreshing recomputes views from scratch, so it is the same as building them; changes are rolled back
+        database = router.db_for_write(Concept)
+        with transaction.atomic(using=database):
+            cursor = connections[database].cursor()
+            for view in MATERIALIZED_VIEWS:
+                self.measure('%s refresh' % view, lambda: self.refresh(cursor, view), options['repeat'])
+            transaction.set_rollback(True, using=database)
+
+    def refresh(self, cursor, view):
+        cursor.execute("REFRESH MATERIALIZED VIEW %s" % view)
+        cursor.execute("SELECT count(*) FROM %s" % view)
+        return cursor.fetchone()[0]
+
+    def benchmark_load(self, options):
+        location = options['release']
+        if not location:
+            location = tempfile.mkdtemp(prefix='snomed_ct_')
+            self.stdout.write('  Generating synthetic release with scale %s...' % options['scale'])
+            SyntheticRelease(options['scale'], seed=options['seed']).write(location)
+
+        # Loaded data is replaced only inside the transaction, which is rolled back at the end
+        database = router.db_for_write(Concept)
+        try:
+            with transaction.atomic(using=database), open(os.devnull, 'w') as devnull:
+                cursor = connections[database].cursor()
+
+                def load():
+                    cursor.execute("TRUNCATE %s CASCADE" % ', '.join(rf2_file.table for rf2_file in RF2_FILES))
+                    call_command('load_snomed_ct_data', location, database=database, stdout=devnull)
+                    return sum(model.objects.using(database).count() for model in self.rf2_models)
+
+                self.measure('load_snomed_ct_data', load, options['repeat'])
+                transaction.set_rollback(True, using=database)
+        finally:
+            if not options['release']:
+                shutil.rmtree(location, ignore_errors=True)
@@ -0,0 +1,35 @@
+from __future__ import unicode_literals
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...models import LangRefSet
+from ...snapshot import SnapshotWriter
+
+
+class Command(BaseCommand):
+    help = 'Compile loaded SNOMED CT release into a memory mappable snapshot file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', type=str)
+        parser.add_argument('--lang', action='append', dest='langs',
+                            help='Language reference set to include terms of, e.g. en_gb. Defaults to all known.')
+        parser.add_argument('--refset', action='append', dest='refsets', type=int, default=[],
+                            help='SCTID of simple reference set to include memberships of.')
+        parser.add_argument('--database', type=str, help='Database to read from, by default chosen by the router.')
+
+    def handle(self, *args, **options):
+        for lang in options['langs'] or []:
+            if not hasattr(LangRefSet.REFSET_CHOICES, lang):
+                raise CommandError("Unknown language reference set %s." % lang)
+
+        writer = SnapshotWriter(options['langs'], options['refsets'], options['database'])
+
+        self.stdout.write('Compiling snapshot...')
+        writer.compile()
+
+        self.stdout.write('Writing snapshot file...')
+        writer.write(options['output'])
+
+        self.stdout.write(self.style.SUCCESS('Successfully compiled snapshot %s (%d bytes).' % (
+            options['output'], os.path.getsize(options['output']))))
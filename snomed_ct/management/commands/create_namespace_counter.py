@@ -1,7 +1,9 @@
 from __future__ import unicode_literals
 
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction, connection
+from django.db import transaction, connections, router
+
+from ...models import Concept
 
 
 class Command(BaseCommand):
@@ -10,14 +12,17 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('snomed_ct_namespace', type=int)
+        parser.add_argument('--database', type=str, help='Database to write to, by default chosen by the router.')
 
     def handle(self, *args, **options):
+        database = options['database'] or router.db_for_write(Concept)
+
         # namespace id has to consists of 7 digits
         if options['snomed_ct_namespace'] < 1000000 or options['snomed_ct_namespace'] > 9999999:
             raise CommandError("Invalid namespace id.")
 
-        with transaction.atomic():
-            cursor = connection.cursor()
+        with transaction.atomic(using=database):
+            cursor = connections[database].cursor()
 
             self.stdout.write("Creating concept counter...")
             cursor.execute("""CREATE SEQUENCE extension_concept_%s;""", [options['snomed_ct_namespace']])
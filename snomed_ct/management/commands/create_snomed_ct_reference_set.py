@@ -1,7 +1,7 @@
 from __future__ import unicode_literals
 
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction, connection
+from django.db import transaction, connections, router
 
 from ...models import Concept
 
@@ -14,17 +14,20 @@ class Command(BaseCommand):
         parser.add_argument('reference_set_name', type=str)
         parser.add_argument('module_sctid', type=int)
         parser.add_argument('snomed_ct_namespace', type=int)
+        parser.add_argument('--database', type=str, help='Database to write to, by default chosen by the router.')
 
     def handle(self, *args, **options):
+        database = options['database'] or router.db_for_write(Concept)
+
         # namespace id has to consists of 7 digits
         if options['snomed_ct_namespace'] < 1000000 or options['snomed_ct_namespace'] > 9999999:
             raise CommandError("Invalid namespace id.")
 
-        if not Concept.objects.filter(pk=options['module_sctid']).exists():
+        if not Concept.objects.using(database).filter(pk=options['module_sctid']).exists():
             raise CommandError("Module with given SCTID does not exists.")
 
-        with transaction.atomic():
-            cursor = connection.cursor()
+        with transaction.atomic(using=database):
+            cursor = connections[database].cursor()
 
             cursor.execute("""SELECT create_snomed_ct_reference_set(%s, %s, %s);""",
                            [options['reference_set_name'], options['snomed_ct_namespace'], options['module_sctid']])
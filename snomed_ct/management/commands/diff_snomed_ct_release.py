@@ -0,0 +1,68 @@
+from __future__ import unicode_literals
+import csv
+import sys
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router
+
+from ...diff import load_incoming_release, release_diff
+from ...exceptions import SNOMEDCTReleaseError
+from ...models import Concept, LangRefSet
+
+
+class Command(BaseCommand):
+    help = 'Report concept changes between the loaded SNOMED CT release and another one.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--location', type=str, help='Location of incoming RF2 release to compare with.')
+        parser.add_argument('--old-schema', type=str, help='Schema with the older loaded release.')
+        parser.add_argument('--new-schema', type=str, help='Schema with the newer loaded release.')
+        parser.add_argument('--codes', type=str, help='File with codes in use, one per line, to restrict report to.')
+        parser.add_argument('--lang', type=str, default='en_us', help='Language reference set of compared terms.')
+        parser.add_argument('--output', type=str, help='CSV file to write the report to, standard output by default.')
+        parser.add_argument('--database', type=str, help='Database to use, by default chosen by the router.')
+
+    def handle(self, *args, **options):
+        if not hasattr(LangRefSet.REFSET_CHOICES, options['lang']):
+            raise CommandError("Unknown language reference set %s." % options['lang'])
+        if options['location'] and options['new_schema']:
+            raise CommandError("Incoming release location and new release schema are mutually exclusive.")
+
+        # Incoming release lives in temporary tables, so the whole comparison has to use the same connection
+        database = options['database'] or router.db_for_write(Concept)
+        old = '%s.%%s' % options['old_schema'] if options['old_schema'] else '%s'
+        new = '%s.%%s' % options['new_schema'] if options['new_schema'] else '%s'
+
+        if options['location']:
+            self.stderr.write('Loading incoming release...')
+            try:
+                load_incoming_release(options['location'], using=database)
+            except SNOMEDCTReleaseError as e:
+                raise CommandError(str(e))
+            new = 'incoming_%s'
+
+        if old == new:
+            raise CommandError("Nothing to compare, give incoming release location or schema of other release.")
+
+        codes = None
+        if options['codes']:
+            with open(options['codes']) as codes_file:
+                codes = [line.strip() for line in codes_file if line.strip()]
+
+        output = open(options['output'], 'w') if options['output'] else sys.stdout
+        try:
+            writer = csv.writer(output)
+            writer.writerow(('concept_id', 'category', 'old_value', 'new_value'))
+
+            summary = Counter()
+            for change in release_diff(old, new, codes, options['lang'], using=database):
+                writer.writerow(change)
+                summary[change.category] += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        for category, count in sorted(summary.items()):
+            self.stderr.write('%-32s %d' % (category, count))
+        self.stderr.write(self.style.SUCCESS('Successfully compared releases, %d changes found.' % sum(summary.values())))
@@ -0,0 +1,99 @@
+from __future__ import unicode_literals
+import io
+import os
+import zipfile
+from datetime import date, datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+
+from ...models import Concept
+from ...rf2 import RF2_FILES, get_export_sql, get_file_path, get_header
+
+
+class _RF2Writer(object):
+    """
+    Receives COPY output and writes it with RF2 CRLF line endings, so files are never held in memory.
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self.rows = 0
+
+    def write(self, data):
+        self.rows += data.count(b'\n')
+        self.output.write(data.replace(b'\n', b'\r\n'))
+
+
+class Command(BaseCommand):
+    help = 'Export SNOMED CT extension content of given modules as RF2 release files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_location', type=str, help='Directory, or ZIP file with --zip, to export to.')
+        parser.add_argument('--modules', type=str, required=True, help='Comma separated ids of exported modules.')
+        parser.add_argument('--namespace', type=int, help='Namespace used in file names instead of INT.')
+        parser.add_argument('--release-type', type=str, default='Snapshot', choices=('Snapshot', 'Delta'))
+        parser.add_argument('--since', type=str,
+                            help='Export only rows changed after this YYYYMMDD date, required for Delta.')
+        parser.add_argument('--until', type=str, help='Export only rows effective at or before this YYYYMMDD date.')
+        parser.add_argument('--release-date', type=str, help='Release date in file names, today by default.')
+        parser.add_argument('--zip', action='store_true', help='Write files into a ZIP archive.')
+        parser.add_argument('--database', type=str, help='Database to use, by default chosen by the router.')
+
+    def get_date(self, value, name):
+        try:
+            return datetime.strptime(value, '%Y%m%d').date() if value else None
+        except ValueError:
+            raise CommandError("%s date %s is not in YYYYMMDD format." % (name, value))
+
+    def handle(self, *args, **options):
+        database = options['database'] or router.db_for_read(Concept)
+        try:
+            modules = [int(module) for module in options['modules'].split(',')]
+        except ValueError:
+            raise CommandError("Modules have to be comma separated SCTIDs.")
+
+        since, until = self.get_date(options['since'], 'Since'), self.get_date(options['until'], 'Until')
+        if options['release_type'] == 'Delta' and not since:
+            raise CommandError("Delta release needs --since date of the previous release.")
+        release_date = (self.get_date(options['release_date'], 'Release') or date.today()).strftime('%Y%m%d')
+        edition = str(options['namespace']) if options['namespace'] else 'INT'
+
+        # Values are validated integers and dates, as COPY does not take query parameters
+        conditions = 'WHERE module_id IN (%s)' % ', '.join(str(module) for module in modules)
+        if since:
+            conditions += " AND effective_time > '%s'" % since.isoformat()
+        if until:
+            conditions += " AND effective_time <= '%s'" % until.isoformat()
+
+        archive = zipfile.ZipFile(options['output_location'], 'w', zipfile.ZIP_DEFLATED) if options['zip'] else None
+        try:
+            # Single snapshot of the database for all files
+            with transaction.atomic(using=database):
+                cursor = connections[database].cursor()
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                for rf2_file in RF2_FILES:
+                    path = get_file_path(rf2_file, '' if archive else options['output_location'], release_date,
+                                         options['release_type'], edition)
+                    rows = self.export(cursor, rf2_file, conditions, path, archive)
+                    self.stdout.write('Exported %d rows of %s file.' % (rows, rf2_file.label))
+        finally:
+            if archive:
+                archive.close()
+
+        self.stdout.write(self.style.SUCCESS('Successfully exported %s %s release to %s.' % (
+            release_date, options['release_type'], options['output_location'])))
+
+    def export(self, cursor, rf2_file, conditions, path, archive):
+        if archive:
+            output = archive.open(path.replace(os.sep, '/'), 'w')
+        else:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            output = io.open(path, 'wb')
+
+        with output:
+            output.write(('\t'.join(get_header(rf2_file)) + '\r\n').encode('utf-8'))
+            writer = _RF2Writer(output)
+            cursor.copy_expert(get_export_sql(rf2_file, conditions), writer)
+        return writer.rows
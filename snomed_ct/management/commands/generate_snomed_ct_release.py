@@ -0,0 +1,32 @@
+from __future__ import unicode_literals
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...synthetic import INTERNATIONAL_CONCEPTS, SyntheticRelease
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic SNOMED CT RF2 Snapshot release for testing and benchmarking.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_location', type=str)
+        parser.add_argument('--scale', type=float, default=0.01,
+                            help='Size relative to the International Edition (%d concepts).' % INTERNATIONAL_CONCEPTS)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, same seed gives the same release.')
+        parser.add_argument('--release-date', type=str, default='20260131', help='Release date in YYYYMMDD format.')
+
+    def handle(self, *args, **options):
+        if not 0 < options['scale'] <= 10:
+            raise CommandError("Scale has to be greater than 0 and at most 10.")
+        try:
+            time.strptime(options['release_date'], '%Y%m%d')
+        except ValueError:
+            raise CommandError("Release date %s is not in YYYYMMDD format." % options['release_date'])
+
+        release = SyntheticRelease(options['scale'], options['release_date'], options['seed'])
+        self.stdout.write('Generating %d concepts...' % release.concept_count)
+        release.write(options['output_location'])
+
+        self.stdout.write(self.style.SUCCESS('Successfully generated synthetic SNOMED CT %s release in %s.' % (
+            options['release_date'], options['output_location'])))
@@ -1,9 +1,15 @@
 from __future__ import unicode_literals
-import os
-import re
 
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction, connection
+from django.db import transaction, connections, router
+
+from ...exceptions import SNOMEDCTReleaseError
+from ...models import Concept, LangRefSet
+from ...release import clear_release_version
+from ...rf2 import RF2_FILES, discover_release_date, filter_rf2_file, get_copy_sql, get_delete_dangling_sql, \
+    get_file_path
+from ...utils import CopyStream
+from ...validation import validate_release
 
 
 class Command(BaseCommand):
@@ -12,131 +18,116 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('snomed_ct_location', type=str)
+        parser.add_argument('--database', type=str, help='Database to write to, by default chosen by the router.')
+        parser.add_argument('--active-only', action='store_true',
+                            help='Skip inactive rows of all files but the concept one. Inactive concepts are kept, '
+                                 'so historical resolution of active association members still works, but members '
+                                 'pointing to inactive descriptions are removed after loading.')
+        parser.add_argument('--modules', type=str,
+                            help='Comma separated module ids, rows of other modules are skipped. Reference set '
+                                 'members pointing to components of other modules are removed after loading.')
+        parser.add_argument('--refsets', type=str,
+                            help='Comma separated reference set ids, members of other reference sets are skipped. '
+                                 'US and GB English language reference sets are always loaded.')
+        parser.add_argument('--skip-files', type=str,
+                            help='Comma separated tables whose files are not loaded, e.g. sct2_extended_map_refset.')
+        parser.add_argument('--validate', action='store_true',
+                            help='Check referential integrity and SCTID check digits of the loaded release.')
+        parser.add_argument('--validation-workers', type=int, default=4,
+                            help='Number of validation checks run in parallel, 4 by default.')
+        parser.add_argument('--parallel-workers', type=int, default=4,
+                            help='Parallel query and index build workers used by view refresh, 4 by default.')
+
+    def get_ids(self, value, name):
+        try:
+            return [int(identifier) for identifier in value.split(',')] if value else None
+        except ValueError:
+            raise CommandError("%s have to be comma separated SCTIDs." % name)
 
     def handle(self, *args, **options):
-        with transaction.atomic():
-            cursor = connection.cursor()
-            self.__discover_release_date(options['snomed_ct_location'])
-
-            self.stdout.write('Loading concept file...')
-            cursor.execute("""
-            COPY sct2_concept(id, effective_time, active, module_id, definition_status_id)
-            FROM %s WITH(FORMAT CSV, HEADER TRUE, DELIMITER '\t');
-            """, [os.path.join(options['snomed_ct_location'], 'Terminology',
-                               'sct2_Concept_Snapshot_INT_%s.txt' % self.release_date)])
-
-            self.stdout.write('Loading description file...')
-            cursor.execute("""
-            COPY sct2_description(id, effective_time, active, module_id, concept_id, language_code, type_id, term,
-                             case_significance_id)
-            FROM %s WITH(FORMAT CSV, HEADER TRUE, DELIMITER '\t', QUOTE E'\b');
-            """, [os.path.join(options['snomed_ct_location'], 'Terminology',
-                               'sct2_Description_Snapshot-en_INT_%s.txt' % self.release_date)])
-
-            self.stdout.write('Loading text definition file...')
-            cursor.execute("""
-            COPY sct2_text_definition(id, effective_time, active, module_id, concept_id, language_code, type_id, term,
-                                 case_significance_id)
-            FROM %s WITH(FORMAT CSV, HEADER TRUE, DELIMITER '\t');
-            """, [os.path.join(options['snomed_ct_location'], 'Terminology',
-                               'sct2_TextDefinition_Snapshot-en_INT_%s.txt' % self.release_date)])
-
-            self.stdout.write('Loading relationship file...')
-            cursor.execute("""
-            COPY sct2_relationship(id, effective_time, active, module_id, source_id, destination_id, relationship_group,
-                              type_id, characteristic_type_id, modifier_id)
-            FROM %s WITH(FORMAT CSV, HEADER TRUE, DELIMITER '\t');
-            """, [os.path.join(options['snomed_ct_location'], 'Terminology',
-                               'sct2_Relationship_Snapshot_INT_%s.txt' % self.release_date)])
-
-            self.stdout.write('Loading stated relationship file...')
-            cursor.execute("""
-            COPY sct2_stated_relationship(id, effective_time, active, module_id, source_id, destination_id,
-                                     relationship_group, type_id, characteristic_type_id, modifier_id)
-            FROM %s WITH(FORMAT CSV, HEADER TRUE, DELIMITER '\t');
-            """, [os.path.join(options['snomed_ct_location'], 'Terminology',
-                               'sct2_StatedRelationship_Snapshot_INT_%s.txt' % self.release_date)])
-
-            self.stdout.write('Loading language reference set file...')
-            cursor.execute("""
-            COPY sct2_lang_refset(id, effective_time, active, module_id, refset_id, referenced_component_id,
-                             acceptability_id)
-            FROM %s WITH(FORMAT CSV, HEADER TRUE, DELIMITER '\t');
-            """, [
-                os.path.join(options['snomed_ct_location'], 'Refset', 'Language',
-                             'der2_cRefset_LanguageSnapshot-en_INT_%s.txt' % self.release_date)])
-
-            self.stdout.write('Loading association reference set file...')
-            cursor.execute("""
-            COPY sct2_association_refset(id, effective_time, active, module_id, refset_id, referenced_component_id,
-                                    target_component_id)
-            FROM %s WITH(FORMAT CSV, HEADER TRUE, DELIMITER '\t');
-            """, [os.path.join(options['snomed_ct_location'], 'Refset', 'Content',
-                               'der2_cRefset_AssociationReferenceSnapshot_INT_%s.txt' % self.release_date)])
-
-            self.stdout.write('Loading simple reference set file...')
-            cursor.execute("""
-            COPY sct2_simple_refset(id, effective_time, active, module_id, refset_id, referenced_component_id)
-            FROM %s WITH(FORMAT CSV, HEADER TRUE, DELIMITER '\t');
-            """, [os.path.join(options['snomed_ct_location'], 'Refset', 'Content',
-                               'der2_Refset_SimpleSnapshot_INT_%s.txt' % self.release_date)])
-
-            self.stdout.write('Loading attribute value reference set file...')
-            cursor.execute("""
-            COPY sct2_attribute_value_refset(id, effective_time, active, module_id, refset_id, referenced_component_id,
-                                        value_id)
-            FROM %s WITH(FORMAT CSV, HEADER TRUE, DELIMITER '\t');
-            """, [os.path.join(options['snomed_ct_location'], 'Refset', 'Content',
-                               'der2_cRefset_AttributeValueSnapshot_INT_%s.txt' % self.release_date)])
-
-            self.stdout.write('Loading simple map reference set file...')
-            cursor.execute("""
-            COPY sct2_simple_map_refset(id, effective_time, active, module_id, refset_id, referenced_component_id,
-                                   map_target)
-            FROM %s WITH(FORMAT CSV, HEADER TRUE, DELIMITER '\t');
-            """, [os.path.join(options['snomed_ct_location'], 'Refset', 'Map',
-                               'der2_sRefset_SimpleMapSnapshot_INT_%s.txt' % self.release_date)])
-
-            self.stdout.write('Loading complex map reference set file...')
-            cursor.execute("""
-            COPY sct2_complex_map_refset(id, effective_time, active, module_id, refset_id, referenced_component_id,
-                                    map_group, map_priority, map_rule, map_advice, map_target, correlation_id)
-            FROM %s WITH(FORMAT CSV, HEADER TRUE, DELIMITER '\t');
-            """, [os.path.join(options['snomed_ct_location'], 'Refset', 'Map',
-                               'der2_iissscRefset_ComplexMapSnapshot_INT_%s.txt' % self.release_date)])
-
-            self.stdout.write('Loading extended map reference set file...')
-            cursor.execute("""
-            COPY sct2_extended_map_refset(id, effective_time, active, module_id, refset_id, referenced_component_id,
-                                     map_group, map_priority, map_rule, map_advice, map_target, correlation_id,
-                                     map_category_id)
-            FROM %s WITH(FORMAT CSV, HEADER TRUE, DELIMITER '\t');
-            """, [os.path.join(options['snomed_ct_location'], 'Refset', 'Map',
-                               'der2_iisssccRefset_ExtendedMapSnapshot_INT_%s.txt' % self.release_date)])
+        database = options['database'] or router.db_for_write(Concept)
+
+        skip_files = set(options['skip_files'].split(',')) if options['skip_files'] else set()
+        unknown_files = skip_files - {rf2_file.table for rf2_file in RF2_FILES}
+        if unknown_files:
+            raise CommandError("Unknown files to skip: %s." % ', '.join(sorted(unknown_files)))
+
+        refsets = self.get_ids(options['refsets'], 'Reference sets')
+        if refsets:
+            refsets += [refset_id for refset_id, _ in LangRefSet.REFSET_CHOICES]
+        filters = {'active_only': options['active_only'], 'modules': self.get_ids(options['modules'], 'Modules'),
+                   'refsets': refsets}
+
+        with transaction.atomic(using=database):
+            cursor = connections[database].cursor()
+            try:
+                self.release_date = discover_release_date(options['snomed_ct_location'])
+            except SNOMEDCTReleaseError as e:
+                raise CommandError(str(e))
+
+            for rf2_file in RF2_FILES:
+                if rf2_file.table in skip_files:
+                    self.stdout.write('Skipping %s file...' % rf2_file.label)
+                    continue
+
+                self.stdout.write('Loading %s file...' % rf2_file.label)
+                path = get_file_path(rf2_file, options['snomed_ct_location'], self.release_date)
+                if any(filters.values()):
+                    # Filtered rows are streamed from the client, unfiltered files are read by the server directly
+                    # Concepts are small and referenced by everything else, inactive ones are always loaded
+                    file_filters = dict(filters,
+                                        active_only=filters['active_only'] and rf2_file.table != 'sct2_concept')
+                    cursor.copy_expert(get_copy_sql(rf2_file, source='STDIN'),
+                                       CopyStream(filter_rf2_file(path, rf2_file, **file_filters), b''))
+                else:
+                    cursor.execute(get_copy_sql(rf2_file), [path])
+
+            if filters['active_only'] or filters['modules']:
+                # Skipped components leave reference set members pointing to them, anti-joins run in the server
+                self.stdout.write('Removing members of skipped components...')
+                for rf2_file in RF2_FILES:
+                    sql = get_delete_dangling_sql(rf2_file)
+                    if sql and rf2_file.table not in skip_files:
+                        cursor.execute(sql)
+
+            # Loaded tables are new to the planner, parallel workers speed up view and index builds
+            for rf2_file in RF2_FILES:
+                cursor.execute("ANALYZE %s" % rf2_file.table)
+            cursor.execute("SELECT set_config('max_parallel_workers_per_gather', %s, TRUE), "
+                           "set_config('max_parallel_maintenance_workers', %s, TRUE);",
+                           [str(options['parallel_workers'])] * 2)
+
+            self.stdout.write('Refreshing concept classification view...')
+            cursor.execute("""REFRESH MATERIALIZED VIEW concept_classification_view;""")
+
+            self.stdout.write('Refreshing terms based view...')
+            cursor.execute("""REFRESH MATERIALIZED VIEW terms_based_view;""")
+
+            self.stdout.write('Refreshing concept summary view...')
+            cursor.execute("""REFRESH MATERIALIZED VIEW concept_summary_view;""")
+
+            self.stdout.write('Refreshing historical resolution view...')
+            cursor.execute("""REFRESH MATERIALIZED VIEW historical_resolution_view;""")
 
             self.stdout.write('Committing changes...')
 
+        clear_release_version()
         self.stdout.write(self.style.SUCCESS('Successfully loaded SNOMED CT %s release.' % self.release_date))
 
-    def __raise_date_mismatch_error(self):
-        raise CommandError("Release files date mismatch. "
-                           "Some of the release files are from different release then the others.")
-
-    def __get_location_file_list(self, location):
-        return [os.path.join(location, file_name) for file_name in os.listdir(location)]
-
-    def __discover_release_date(self, location):
-        release_file_list = []
-        release_file_list.extend(self.__get_location_file_list(os.path.join(location, 'Terminology')))
-        release_file_list.extend(self.__get_location_file_list(os.path.join(location, 'Refset', 'Language')))
-        release_file_list.extend(self.__get_location_file_list(os.path.join(location, 'Refset', 'Content')))
-        release_file_list.extend(self.__get_location_file_list(os.path.join(location, 'Refset', 'Map')))
-
-        for file_path in release_file_list:
-            file_name = os.path.basename(file_path)
-            match = re.match(r'(sct2|der2)_[\w\-_]+(?P<date>\d{8})\.txt', file_name)
-
-            if not self.release_date:
-                self.release_date = match.group('date')
-            elif self.release_date != match.group('date'):
-                self.__raise_date_mismatch_error()
+        if options['validate']:
+            self.validate(database, options['validation_workers'])
+
+    def validate(self, database, workers):
+        self.stdout.write('Validating release...')
+        violations = 0
+        for result in validate_release(database, workers):
+            if result.count:
+                violations += result.count
+                self.stdout.write(self.style.ERROR('  %s: %d violations, e.g. %s' % (
+                    result.name, result.count, ', '.join(result.samples))))
+            else:
+                self.stdout.write('  %s: OK' % result.name)
+
+        if violations:
+            raise CommandError("Loaded release has %d integrity violations." % violations)
+        self.stdout.write(self.style.SUCCESS('Release is valid.'))
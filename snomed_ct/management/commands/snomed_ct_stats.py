@@ -0,0 +1,47 @@
+from __future__ import unicode_literals
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Instrumented APIs are registered on import
+from ... import aio, hierarchy, lookup, models, terms, views  # noqa
+from ...metrics import get_metrics, get_percentile
+
+
+class Command(BaseCommand):
+    help = 'Show call counts, query counts, latencies and cache hit ratios of SNOMED CT terminology APIs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Output raw statistics as JSON.')
+        parser.add_argument('--reset', action='store_true', help='Reset statistics after showing them.')
+
+    def handle(self, *args, **options):
+        metrics = get_metrics()
+        if metrics is None:
+            raise CommandError("Metrics are disabled, set SNOMED_CT_METRICS to e.g. 'snomed_ct.metrics.CacheMetrics'.")
+
+        stats = metrics.get_stats()
+        if options['json']:
+            self.stdout.write(json.dumps(stats, indent=2, sort_keys=True))
+        else:
+            self.write_stats(stats)
+
+        if options['reset']:
+            metrics.reset()
+            self.stdout.write(self.style.SUCCESS('Statistics reset.'))
+
+    def write_stats(self, stats):
+        self.stdout.write(self.style.MIGRATE_HEADING('Calls:'))
+        self.stdout.write("  %-45s %10s %12s %10s %10s %10s" % ('name', 'calls', 'queries/call', 'mean ms',
+                                                              'p50 ms', 'p95 ms'))
+        for name, call in sorted(stats['calls'].items()):
+            p50, p95 = get_percentile(call['histogram'], 0.5), get_percentile(call['histogram'], 0.95)
+            self.stdout.write("  %-45s %10d %12.2f %10.2f %10s %10s" % (
+                name, call['count'], float(call['queries']) / call['count'], call['seconds'] * 1000 / call['count'],
+                '<=%s' % p50 if p50 is not None else 'slower', '<=%s' % p95 if p95 is not None else 'slower'))
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Caches:'))
+        for name, cache in sorted(stats['caches'].items()):
+            total = cache['hits'] + cache['misses']
+            self.stdout.write("  %-45s %10d hits %10d misses %8.1f%% hit ratio" % (
+                name, cache['hits'], cache['misses'], 100.0 * cache['hits'] / total))
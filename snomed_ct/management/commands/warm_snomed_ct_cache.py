@@ -0,0 +1,72 @@
+from __future__ import unicode_literals
+import pickle
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router
+
+from ...models import Description, LangRefSet, cache, get_fully_specified_name_key, get_preferred_term_key
+from ...utils import stream_query
+
+
+class Command(BaseCommand):
+    help = 'Precompute preferred terms and fully specified names of active concepts into the snomed_ct cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lang', type=str, default='en_us', help='Language reference set, e.g. en_gb.')
+        parser.add_argument('--refset', action='append', dest='refsets', type=int, default=[],
+                            help='SCTID of simple reference set to limit warm up to its members.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Number of cache entries per set_many.')
+        parser.add_argument('--database', type=str, help='Database to read from, by default chosen by the router.')
+
+    def handle(self, *args, **options):
+        if not hasattr(LangRefSet.REFSET_CHOICES, options['lang']):
+            raise CommandError("Unknown language reference set %s." % options['lang'])
+
+        database = options['database'] or router.db_for_read(Description)
+        fields = Description._meta.concrete_fields
+        field_names = [field.attname for field in fields]
+        cache_keys = {
+            Description.TYPE_CHOICES.synonym: get_preferred_term_key,
+            Description.TYPE_CHOICES.fully_specified_name: get_fully_specified_name_key,
+        }
+
+        rows = stream_query("""
+            SELECT %s
+            FROM sct2_description d
+              JOIN sct2_lang_refset l ON l.referenced_component_id = d.id
+              JOIN sct2_concept c ON c.id = d.concept_id
+            WHERE c.active = TRUE AND d.active = TRUE AND l.active = TRUE AND d.type_id IN (%%s, %%s) AND
+                  l.refset_id = %%s AND l.acceptability_id = %%s AND
+                  (%%s OR d.concept_id IN (
+                    SELECT r.referenced_component_id FROM sct2_simple_refset r
+                    WHERE r.active = TRUE AND r.refset_id = ANY (%%s :: BIGINT [])));
+        """ % ', '.join('d.%s' % field.column for field in fields), [
+            Description.TYPE_CHOICES.synonym, Description.TYPE_CHOICES.fully_specified_name,
+            getattr(LangRefSet.REFSET_CHOICES, options['lang']), LangRefSet.ACCEPTABILITY_CHOICES.preferred,
+            not options['refsets'], options['refsets']], using=database, chunk_size=options['batch_size'])
+
+        self.stdout.write('Warming up cache...')
+        start = time.time()
+        count, size, batch = 0, 0, {}
+        type_index = field_names.index('type_id')
+        concept_index = field_names.index('concept_id')
+
+        for row in rows:
+            key = cache_keys[row[type_index]](row[concept_index])
+            batch[key] = Description.from_db(database, field_names, row)
+            size += len(key) + len(pickle.dumps(batch[key], pickle.HIGHEST_PROTOCOL))
+
+            if len(batch) >= options['batch_size']:
+                cache.set_many(batch, None)
+                count += len(batch)
+                batch = {}
+
+        if batch:
+            cache.set_many(batch, None)
+            count += len(batch)
+
+        elapsed = time.time() - start
+        self.stdout.write(self.style.SUCCESS(
+            "Successfully cached %d terms in %.1fs (%.0f entries/s, approximately %.1f MB)." % (
+                count, elapsed, count / elapsed if elapsed else 0, size / 1024.0 / 1024.0)))
@@ -1,9 +1,81 @@
-from django.db.models import Manager
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import CharField, Manager, OuterRef, QuerySet, Subquery
+from pgsearch.managers import ReadOnlySearchManager
 
 from .exceptions import SNOMEDCTModelOperationNotPermitted
+from .metrics import instrumented
+from .utils import chunked, stream_query
+
+
+_record_classes = {}
+
+
+def get_record_class(model, fields):
+    key = (model, fields)
+    if key not in _record_classes:
+        # Namedtuple records are immutable and have empty __slots__, so they cost hardly more than plain tuples
+        _record_classes[key] = namedtuple('%sRecord' % model.__name__, fields)
+    return _record_classes[key]
+
+
+class SNOMEDCTQuerySet(QuerySet):
+    def __term_subquery(self, concept_ref, type_id, lang):
+        from .models import LangRefSet, Description
+
+        return Subquery(Description.objects.filter(
+            concept=concept_ref,
+            active=True,
+            type=type_id,
+            lang_refset__active=True,
+            lang_refset__acceptability=LangRefSet.ACCEPTABILITY_CHOICES.preferred,
+            lang_refset__refset=getattr(LangRefSet.REFSET_CHOICES, lang)
+        ).values('term')[:1], output_field=CharField())
+
+    def with_terms(self, lang='en_us', fields=None, fully_specified_name=False):
+        """
+        Annotates preferred terms (and optionally fully specified names) of the concepts referenced by given
+        fields, e.g. fields=['source', 'destination', 'type'] adds source_preferred_term, destination_preferred_term
+        and type_preferred_term. Without fields the row itself is treated as a concept.
+        """
+        from .models import Description
 
+        annotations = {}
+        for field in fields or [None]:
+            concept_ref = OuterRef(field or 'pk')
+            prefix = '%s_' % field if field else ''
+
+            annotations[prefix + 'preferred_term'] = self.__term_subquery(
+                concept_ref, Description.TYPE_CHOICES.synonym, lang)
+            if fully_specified_name:
+                annotations[prefix + 'fully_specified_name'] = self.__term_subquery(
+                    concept_ref, Description.TYPE_CHOICES.fully_specified_name, lang)
+
+        return self.annotate(**annotations)
+
+    def records(self, *fields):
+        """
+        Fast read mode: yields immutable records built straight from values_list rows, without model
+        instantiation. By default all concrete fields are read, foreign keys as their *_id values.
+        """
+        fields = fields or tuple(field.attname for field in self.model._meta.concrete_fields)
+        make_record = get_record_class(self.model, tuple(fields))._make
+        for row in self.values_list(*fields).iterator():
+            yield make_record(row)
+
+
+class SNOMEDCTModelManager(Manager.from_queryset(SNOMEDCTQuerySet)):
+    def __init__(self, active_only=False):
+        super(SNOMEDCTModelManager, self).__init__()
+        self.active_only = active_only
+
+    def get_queryset(self):
+        # Literal active = true condition lets the planner prune inactive partitions
+        queryset = super(SNOMEDCTModelManager, self).get_queryset()
+        return queryset.filter(active=True) if self.active_only else queryset
 
-class SNOMEDCTModelManager(Manager):
     def create(self, *args, **kwargs):
         raise SNOMEDCTModelOperationNotPermitted
 
@@ -21,3 +93,123 @@ class SNOMEDCTModelManager(Manager):
 
     def update(self, *args, **kwargs):
         raise SNOMEDCTModelOperationNotPermitted
+
+
+class HistoricalResolutionManager(SNOMEDCTModelManager):
+    @instrumented('historical_resolution.resolve')
+    def resolve(self, concept_ids, exact_only=False, chunk_size=10000):
+        """
+        Yields (concept_id, target_concept_id, depth, exact) for every given concept id.
+        Active concepts resolve to themselves, unknown or unresolvable ones to None.
+        Inactive concepts with several possible targets yield one row per target.
+        """
+        for chunk in chunked(concept_ids, chunk_size):
+            for row in stream_query("""
+                SELECT
+                  i.id,
+                  CASE WHEN c.active THEN i.id ELSE r.target_concept_id END,
+                  CASE WHEN c.active THEN 0 ELSE r.depth END,
+                  coalesce(c.active OR r.exact, FALSE)
+                FROM unnest(%s :: BIGINT []) WITH ORDINALITY AS i(id, position)
+                  LEFT JOIN sct2_concept c ON c.id = i.id
+                  LEFT JOIN historical_resolution_view r
+                    ON r.concept_id = i.id AND c.active = FALSE AND (r.exact OR NOT %s)
+                ORDER BY i.position, r.depth;
+            """, [[int(concept_id) for concept_id in chunk], exact_only], using=self.db, chunk_size=chunk_size):
+                yield row
+
+
+class ConceptSummaryManager(SNOMEDCTModelManager):
+    def for_lang(self, lang='en_us'):
+        """
+        Summaries in one language reference set. The view has a row per concept and language reference set,
+        so concept is unique only within the returned queryset.
+        """
+        from .models import LangRefSet
+        return self.filter(lang_refset_refset=getattr(LangRefSet.REFSET_CHOICES, lang))
+
+    def get_summary(self, concept_id, lang='en_us'):
+        return self.for_lang(lang).get(concept_id=concept_id)
+
+
+class DefiningRelationshipManager(SNOMEDCTModelManager):
+    @instrumented('defining_relationship.attribute_groups')
+    def attribute_groups(self, concept_ids=None, include_is_a=False, chunk_size=10000):
+        """
+        Yields active defining relationships as (source_id, relationship_group, type_id, destination_id) tuples,
+        ordered by source and group. Without concept ids the whole table is streamed.
+        """
+        from .models import Relationship
+
+        sql = """
+            SELECT r.source_id, r.relationship_group, r.type_id, r.destination_id
+            FROM %s r
+            WHERE r.active = TRUE AND r.characteristic_type_id <> %%s AND (r.type_id <> %%s OR %%s) %s
+            ORDER BY r.source_id, r.relationship_group, r.type_id, r.destination_id;
+        """
+        params = [Relationship.CHARACTERISTIC_TYPE_CHOICES.additional, Relationship.TYPE_CHOICES.is_a, include_is_a]
+
+        if concept_ids is None:
+            for row in stream_query(sql % (self.model._meta.db_table, ''), params, using=self.db,
+                                    chunk_size=chunk_size):
+                yield row
+            return
+
+        for chunk in chunked(concept_ids, chunk_size):
+            for row in stream_query(sql % (self.model._meta.db_table, 'AND r.source_id = ANY (%s :: BIGINT [])'),
+                                    params + [[int(concept_id) for concept_id in chunk]], using=self.db,
+                                    chunk_size=chunk_size):
+                yield row
+
+
+FUZZY_SEARCH_DEFAULTS = {
+    # weight of full text rank, trigram word similarity and description priority (FSN, preferred term, synonym)
+    'rank': 1.0,
+    'similarity': 1.0,
+    'priority': 0.25,
+    # minimal word similarity of misspelled terms
+    'threshold': 0.5,
+}
+
+
+class TermSearchManager(ReadOnlySearchManager):
+    @instrumented('term_search.search')
+    def search(self, *args, **kwargs):
+        return super(TermSearchManager, self).search(*args, **kwargs)
+
+    @instrumented('term_search.fuzzy_search')
+    def fuzzy_search(self, query, limit=20, weights=None, **filters):
+        """
+        Typo tolerant search combining full text rank, trigram similarity and term priority in a single query
+        served by the full text and trigram indexes. Default weights are taken from SNOMED_CT_FUZZY_SEARCH setting.
+        Returns list of view rows ordered by score, which is available as score attribute.
+        """
+        options = dict(FUZZY_SEARCH_DEFAULTS)
+        options.update(getattr(settings, 'SNOMED_CT_FUZZY_SEARCH', {}))
+        options.update(weights or {})
+
+        conditions, params = [], []
+        for field, value in sorted(filters.items()):
+            conditions.append('AND t.%s = %%s' % self.model._meta.get_field(field).column)
+            params.append(value)
+
+        sql = """
+            SELECT t.*,
+              %%s * ts_rank(t.search_term, q.query) +
+              %%s * word_similarity(q.text, t.description_search_text) +
+              %%s * CASE t.description_priority WHEN 'B' THEN 1.0 WHEN 'C' THEN 0.5 ELSE 0.25 END AS score
+            FROM terms_based_view t,
+              (SELECT plainto_tsquery('simple', unaccent(%%s)) AS query, lower(unaccent(%%s)) AS text) q
+            WHERE (t.search_term @@ q.query OR q.text <%%%% t.description_search_text) %s
+            ORDER BY score DESC
+            LIMIT %%s
+        """ % ' '.join(conditions)
+
+        # Router may pick a different database on every call, the threshold has to be set in the same transaction
+        using = self.db
+        with transaction.atomic(using=using):
+            with connections[using].cursor() as cursor:
+                cursor.execute("""SELECT set_config('pg_trgm.word_similarity_threshold', %s, TRUE);""",
+                               [str(options['threshold'])])
+            return list(self.db_manager(using).raw(sql, [options['rank'], options['similarity'], options['priority'],
+                                                         query, query] + params + [limit]))
@@ -0,0 +1,233 @@
+from __future__ import unicode_literals
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+# Upper bounds of latency histogram buckets in milliseconds, the last bucket collects everything slower
+LATENCY_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Names of instrumented APIs and caches, filled in when the decorated functions are defined
+OPERATIONS = set()
+CACHES = set()
+
+_backend = None
+_backend_loaded = False
+
+
+class BaseMetrics(object):
+    """
+    Metrics hook interface. SNOMED_CT_METRICS setting is a dotted path of the subclass to use, leaving it unset
+    disables the instrumentation. Methods are called on the hot path, so implementations should only aggregate
+    and publish elsewhere in the background or in batches.
+    """
+
+    def record_call(self, name, duration, queries):
+        raise NotImplementedError
+
+    def record_cache(self, name, hit):
+        raise NotImplementedError
+
+    def get_stats(self):
+        raise NotImplementedError
+
+    def reset(self):
+        raise NotImplementedError
+
+
+class CacheMetrics(BaseMetrics):
+    """
+    Aggregates metrics in the process and adds them to counters in the snomed_ct cache every flush_interval
+    seconds, so that totals of all processes sharing the cache can be read by the snomed_ct_stats command.
+    """
+    key_prefix = 'metrics'
+
+    def __init__(self, flush_interval=10):
+        self.flush_interval = flush_interval
+        self.cache = caches['snomed_ct']
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.flushed = time.time()
+
+    def key(self, *parts):
+        return ':'.join((self.key_prefix,) + tuple(str(part) for part in parts))
+
+    def add(self, counts):
+        with self.lock:
+            for key, count in counts:
+                self.pending[key] = self.pending.get(key, 0) + count
+            if time.time() - self.flushed < self.flush_interval:
+                return
+            pending, self.pending, self.flushed = self.pending, {}, time.time()
+        self.flush(pending)
+
+    def flush(self, pending=None):
+        if pending is None:
+            with self.lock:
+                pending, self.pending, self.flushed = self.pending, {}, time.time()
+        for key, count in pending.items():
+            # add() is a no-op for existing keys, incr() is atomic in memcached and redis backends
+            if not self.cache.add(key, count, None):
+                self.cache.incr(key, count)
+
+    def record_call(self, name, duration, queries):
+        self.add((
+            (self.key('call', name, 'count'), 1),
+            (self.key('call', name, 'queries'), queries),
+            (self.key('call', name, 'microseconds'), int(duration * 1000000)),
+            (self.key('call', name, 'bucket', bisect_left(LATENCY_BUCKETS, duration * 1000)), 1),
+        ))
+
+    def record_cache(self, name, hit):
+        self.add(((self.key('cache', name, 'hits' if hit else 'misses'), 1),))
+
+    def get_stats(self):
+        self.flush()
+        keys = []
+        for name in OPERATIONS:
+            keys.extend(self.key('call', name, field) for field in ('count', 'queries', 'microseconds'))
+            keys.extend(self.key('call', name, 'bucket', bucket) for bucket in range(len(LATENCY_BUCKETS) + 1))
+        for name in CACHES:
+            keys.extend(self.key('cache', name, field) for field in ('hits', 'misses'))
+        values = self.cache.get_many(keys)
+
+        stats = {'calls': {}, 'caches': {}}
+        for name in OPERATIONS:
+            count = values.get(self.key('call', name, 'count'), 0)
+            if count:
+                stats['calls'][name] = {
+                    'count': count,
+                    'queries': values.get(self.key('call', name, 'queries'), 0),
+                    'seconds': values.get(self.key('call', name, 'microseconds'), 0) / 1000000.0,
+                    'histogram': [values.get(self.key('call', name, 'bucket', bucket), 0)
+                                  for bucket in range(len(LATENCY_BUCKETS) + 1)],
+                }
+        for name in CACHES:
+            hits = values.get(self.key('cache', name, 'hits'), 0)
+            misses = values.get(self.key('cache', name, 'misses'), 0)
+            if hits or misses:
+                stats['caches'][name] = {'hits': hits, 'misses': misses}
+        return stats
+
+    def reset(self):
+        with self.lock:
+            self.pending = {}
+        self.cache.delete_many([self.key('call', name, field) for name in OPERATIONS
+                                for field in ('count', 'queries', 'microseconds')] +
+                               [self.key('call', name, 'bucket', bucket) for name in OPERATIONS
+                                for bucket in range(len(LATENCY_BUCKETS) + 1)] +
+                               [self.key('cache', name, field) for name in CACHES for field in ('hits', 'misses')])
+
+
+def get_metrics():
+    global _backend, _backend_loaded
+    if not _backend_loaded:
+        path = getattr(settings, 'SNOMED_CT_METRICS', None)
+        _backend = import_string(path)() if path else None
+        _backend_loaded = True
+    return _backend
+
+
+@receiver(setting_changed)
+def reset_metrics_backend(setting, **kwargs):
+    global _backend_loaded
+    if setting == 'SNOMED_CT_METRICS':
+        _backend_loaded = False
+
+
+def get_percentile(histogram, percentile):
+    """
+    Returns upper bound in milliseconds of the histogram bucket the percentile falls into, None for the last one.
+    """
+    threshold, total = sum(histogram) * percentile, 0
+    for bucket, count in enumerate(histogram):
+        total += count
+        if total >= threshold and count:
+            return LATENCY_BUCKETS[bucket] if bucket < len(LATENCY_BUCKETS) else None
+    return 0
+
+
+def register_cache(name):
+    CACHES.add(name)
+    return name
+
+
+def record_cache(name, hit):
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.record_cache(name, hit)
+
+
+class _QueryCounter(object):
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        # Query execution wrappers need Django 2.0, query counts are reported as 0 with older versions
+        for connection in connections.all():
+            if hasattr(connection, 'execute_wrappers'):
+                connection.execute_wrappers.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        for connection in connections.all():
+            if self in getattr(connection, 'execute_wrappers', ()):
+                connection.execute_wrappers.remove(self)
+
+
+def instrumented(name):
+    """
+    Records call count, database query count and latency of the decorated function. Generator functions are
+    measured until they are exhausted or closed. Costs a single function call when metrics are disabled.
+    """
+    OPERATIONS.add(name)
+
+    def decorator(func):
+        if inspect.isgeneratorfunction(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                metrics = get_metrics()
+                if metrics is None:
+                    for item in func(*args, **kwargs):
+                        yield item
+                    return
+
+                start, counter = time.time(), _QueryCounter()
+                try:
+                    iterator = func(*args, **kwargs)
+                    while True:
+                        with counter:
+                            try:
+                                item = next(iterator)
+                            except StopIteration:
+                                return
+                        yield item
+                finally:
+                    metrics.record_call(name, time.time() - start, counter.count)
+        else:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                metrics = get_metrics()
+                if metrics is None:
+                    return func(*args, **kwargs)
+
+                start, counter = time.time(), _QueryCounter()
+                try:
+                    with counter:
+                        return func(*args, **kwargs)
+                finally:
+                    metrics.record_call(name, time.time() - start, counter.count)
+        return wrapper
+    return decorator
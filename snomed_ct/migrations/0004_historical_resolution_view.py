@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snomed_ct', '0003_search_view'),
+    ]
+
+    operations = [
+        migrations.RunSQL("""
+            ------ Create View ------
+            -- Follows SAME AS, REPLACED BY and POSSIBLY EQUIVALENT TO associations from every inactive concept
+            -- until an active concept is reached. Visited concepts are kept in the path to stop on cycles.
+            CREATE MATERIALIZED VIEW historical_resolution_view AS
+              WITH RECURSIVE association AS (
+                  SELECT
+                    a.referenced_component_id AS source_id,
+                    a.target_component_id     AS target_id,
+                    a.refset_id               AS refset_id
+                  FROM sct2_association_refset a
+                  WHERE a.active = TRUE AND a.refset_id IN (900000000000527005, 900000000000526001, 900000000000523009)
+              ), chain(concept_id, target_id, depth, exact, path, is_cycle) AS (
+                  SELECT
+                    a.source_id,
+                    a.target_id,
+                    1,
+                    a.refset_id <> 900000000000523009,
+                    ARRAY [a.source_id, a.target_id],
+                    a.source_id = a.target_id
+                  FROM association a
+                    JOIN sct2_concept c ON c.id = a.source_id AND c.active = FALSE
+                  UNION ALL
+                  SELECT
+                    ch.concept_id,
+                    a.target_id,
+                    ch.depth + 1,
+                    ch.exact AND a.refset_id <> 900000000000523009,
+                    ch.path || a.target_id,
+                    a.target_id = ANY (ch.path)
+                  FROM chain ch
+                    JOIN sct2_concept c ON c.id = ch.target_id AND c.active = FALSE
+                    JOIN association a ON a.source_id = ch.target_id
+                  WHERE NOT ch.is_cycle
+              )
+              SELECT
+                ch.concept_id                                          AS concept_id,
+                ch.target_id                                           AS target_concept_id,
+                min(ch.depth)                                          AS depth,
+                bool_or(ch.exact)                                      AS exact
+              FROM chain ch
+                JOIN sct2_concept c ON c.id = ch.target_id AND c.active = TRUE
+              WHERE NOT ch.is_cycle
+              GROUP BY ch.concept_id, ch.target_id;
+
+
+            CREATE INDEX idx_on_historical_resolution_view ON historical_resolution_view (concept_id);
+        """, """
+            DROP INDEX IF EXISTS idx_on_historical_resolution_view;
+            DROP MATERIALIZED VIEW IF EXISTS historical_resolution_view CASCADE;
+        """)
+    ]
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snomed_ct', '0004_historical_resolution_view'),
+    ]
+
+    operations = [
+        migrations.RunSQL("""
+            CREATE INDEX idx_on_sct2_description_concept ON sct2_description (concept_id);
+            CREATE INDEX idx_on_sct2_lang_refset_referenced_component ON sct2_lang_refset (referenced_component_id);
+        """, """
+            DROP INDEX IF EXISTS idx_on_sct2_description_concept;
+            DROP INDEX IF EXISTS idx_on_sct2_lang_refset_referenced_component;
+        """)
+    ]
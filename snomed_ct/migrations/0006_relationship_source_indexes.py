@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snomed_ct', '0005_term_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL("""
+            CREATE INDEX idx_on_sct2_relationship_source ON sct2_relationship (source_id, relationship_group);
+            CREATE INDEX idx_on_sct2_stated_relationship_source ON sct2_stated_relationship (source_id, relationship_group);
+        """, """
+            DROP INDEX IF EXISTS idx_on_sct2_relationship_source;
+            DROP INDEX IF EXISTS idx_on_sct2_stated_relationship_source;
+        """)
+    ]
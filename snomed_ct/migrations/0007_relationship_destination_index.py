@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snomed_ct', '0006_relationship_source_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL("""
+            CREATE INDEX idx_on_sct2_relationship_destination ON sct2_relationship (destination_id, type_id);
+        """, """
+            DROP INDEX IF EXISTS idx_on_sct2_relationship_destination;
+        """)
+    ]
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snomed_ct', '0007_relationship_destination_index'),
+    ]
+
+    operations = [
+        migrations.RunSQL("""
+            CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+            ------ Create Views ------
+            -- Semantic tag is taken from the fully specified name, top level hierarchy is the ancestor
+            -- directly below 138875005|SNOMED CT Concept|.
+            CREATE MATERIALIZED VIEW concept_classification_view AS
+              WITH RECURSIVE is_a AS (
+                  SELECT r.source_id, r.destination_id
+                  FROM sct2_relationship r
+                  WHERE r.active = TRUE AND r.type_id = 116680003 AND r.characteristic_type_id <> 900000000000227009
+              ), top_level(concept_id, top_level_id) AS (
+                  SELECT i.source_id, i.source_id
+                  FROM is_a i
+                  WHERE i.destination_id = 138875005
+                  UNION
+                  SELECT i.source_id, t.top_level_id
+                  FROM top_level t
+                    JOIN is_a i ON i.destination_id = t.concept_id
+              ), fully_specified_name AS (
+                  SELECT DISTINCT ON (d.concept_id) d.concept_id, d.term
+                  FROM sct2_description d
+                  WHERE d.active = TRUE AND d.type_id = 900000000000003001
+                  ORDER BY d.concept_id, d.effective_time DESC
+              )
+              SELECT
+                c.id                                                          AS concept_id,
+                substring(f.term FROM '[(]([^()]+)[)][[:space:]]*$')          AS semantic_tag,
+                t.top_level_id                                                AS top_level_concept_id
+              FROM sct2_concept c
+                LEFT JOIN fully_specified_name f ON f.concept_id = c.id
+                LEFT JOIN (
+                  SELECT concept_id, min(top_level_id) AS top_level_id FROM top_level GROUP BY concept_id
+                ) t ON t.concept_id = c.id;
+
+            CREATE UNIQUE INDEX idx_on_concept_classification_view ON concept_classification_view (concept_id);
+
+
+            DROP INDEX IF EXISTS idx_on_search_view;
+            DROP INDEX IF EXISTS idx_on_terms_based_view;
+            DROP MATERIALIZED VIEW IF EXISTS terms_based_view CASCADE;
+
+            CREATE MATERIALIZED VIEW terms_based_view AS
+              SELECT
+                l.refset_id                                            AS lang_refset_refset_id,
+                l.acceptability_id                                     AS lang_refset_acceptability_id,
+
+                d.id                                                   AS description_id,
+                d.language_code                                        AS description_language_code,
+                d.type_id                                              AS description_type_id,
+                d.case_significance_id                                 AS description_case_significance_id,
+                d.term                                                 AS description_term,
+
+                c.id                                                   AS concept_id,
+                c.active                                               AS concpet_active,
+                c.definition_status_id                                 AS concpet_definition_status_id,
+                cc.semantic_tag                                        AS concept_semantic_tag,
+                cc.top_level_concept_id                                AS concept_top_level_id,
+
+                setweight(to_tsvector(get_lang_type(d.language_code), unaccent(d.term)),
+                          get_priority(d.type_id, l.acceptability_id)) ||
+                setweight(to_tsvector('simple', unaccent(d.term)), 'A') AS search_term
+              FROM sct2_lang_refset l
+                LEFT JOIN sct2_description d ON d.id = l.referenced_component_id
+                LEFT JOIN sct2_concept c ON c.id = d.concept_id
+                LEFT JOIN concept_classification_view cc ON cc.concept_id = d.concept_id
+              WHERE l.active = TRUE AND d.active = TRUE;
+
+
+            CREATE INDEX idx_on_search_view ON terms_based_view USING GIN (search_term);
+            CREATE INDEX idx_on_terms_based_view ON terms_based_view (description_term);
+            CREATE INDEX idx_on_search_view_semantic_tag ON terms_based_view USING GIN (concept_semantic_tag, search_term);
+            CREATE INDEX idx_on_search_view_top_level ON terms_based_view USING GIN (concept_top_level_id, search_term);
+        """, """
+            DROP INDEX IF EXISTS idx_on_search_view;
+            DROP INDEX IF EXISTS idx_on_terms_based_view;
+            DROP INDEX IF EXISTS idx_on_search_view_semantic_tag;
+            DROP INDEX IF EXISTS idx_on_search_view_top_level;
+            DROP MATERIALIZED VIEW IF EXISTS terms_based_view CASCADE;
+
+            CREATE MATERIALIZED VIEW terms_based_view AS
+              SELECT
+                l.refset_id                                            AS lang_refset_refset_id,
+                l.acceptability_id                                     AS lang_refset_acceptability_id,
+
+                d.id                                                   AS description_id,
+                d.language_code                                        AS description_language_code,
+                d.type_id                                              AS description_type_id,
+                d.case_significance_id                                 AS description_case_significance_id,
+                d.term                                                 AS description_term,
+
+                c.id                                                   AS concept_id,
+                c.active                                               AS concpet_active,
+                c.definition_status_id                                 AS concpet_definition_status_id,
+
+                setweight(to_tsvector(get_lang_type(d.language_code), unaccent(d.term)),
+                          get_priority(d.type_id, l.acceptability_id)) ||
+                setweight(to_tsvector('simple', unaccent(d.term)), 'A') AS search_term
+              FROM sct2_lang_refset l
+                LEFT JOIN sct2_description d ON d.id = l.referenced_component_id
+                LEFT JOIN sct2_concept c ON c.id = d.concept_id
+              WHERE l.active = TRUE AND d.active = TRUE;
+
+
+            CREATE INDEX idx_on_search_view ON terms_based_view USING GIN (search_term);
+            CREATE INDEX idx_on_terms_based_view ON terms_based_view (description_term);
+
+            DROP INDEX IF EXISTS idx_on_concept_classification_view;
+            DROP MATERIALIZED VIEW IF EXISTS concept_classification_view CASCADE;
+        """)
+    ]
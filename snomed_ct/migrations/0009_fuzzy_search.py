@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snomed_ct', '0008_concept_classification'),
+    ]
+
+    operations = [
+        migrations.RunSQL("""
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+            DROP INDEX IF EXISTS idx_on_search_view;
+            DROP INDEX IF EXISTS idx_on_terms_based_view;
+            DROP INDEX IF EXISTS idx_on_search_view_semantic_tag;
+            DROP INDEX IF EXISTS idx_on_search_view_top_level;
+            DROP MATERIALIZED VIEW IF EXISTS terms_based_view CASCADE;
+
+            CREATE MATERIALIZED VIEW terms_based_view AS
+              SELECT
+                l.refset_id                                            AS lang_refset_refset_id,
+                l.acceptability_id                                     AS lang_refset_acceptability_id,
+
+                d.id                                                   AS description_id,
+                d.language_code                                        AS description_language_code,
+                d.type_id                                              AS description_type_id,
+                d.case_significance_id                                 AS description_case_significance_id,
+                d.term                                                 AS description_term,
+
+                c.id                                                   AS concept_id,
+                c.active                                               AS concpet_active,
+                c.definition_status_id                                 AS concpet_definition_status_id,
+                cc.semantic_tag                                        AS concept_semantic_tag,
+                cc.top_level_concept_id                                AS concept_top_level_id,
+
+                lower(unaccent(d.term))                                AS description_search_text,
+                get_priority(d.type_id, l.acceptability_id)            AS description_priority,
+
+                setweight(to_tsvector(get_lang_type(d.language_code), unaccent(d.term)),
+                          get_priority(d.type_id, l.acceptability_id)) ||
+                setweight(to_tsvector('simple', unaccent(d.term)), 'A') AS search_term
+              FROM sct2_lang_refset l
+                LEFT JOIN sct2_description d ON d.id = l.referenced_component_id
+                LEFT JOIN sct2_concept c ON c.id = d.concept_id
+                LEFT JOIN concept_classification_view cc ON cc.concept_id = d.concept_id
+              WHERE l.active = TRUE AND d.active = TRUE;
+
+
+            CREATE INDEX idx_on_search_view ON terms_based_view USING GIN (search_term);
+            CREATE INDEX idx_on_terms_based_view ON terms_based_view (description_term);
+            CREATE INDEX idx_on_search_view_semantic_tag ON terms_based_view USING GIN (concept_semantic_tag, search_term);
+            CREATE INDEX idx_on_search_view_top_level ON terms_based_view USING GIN (concept_top_level_id, search_term);
+            CREATE INDEX idx_on_search_view_trigram ON terms_based_view USING GIN (description_search_text gin_trgm_ops);
+        """, """
+            DROP INDEX IF EXISTS idx_on_search_view;
+            DROP INDEX IF EXISTS idx_on_terms_based_view;
+            DROP INDEX IF EXISTS idx_on_search_view_semantic_tag;
+            DROP INDEX IF EXISTS idx_on_search_view_top_level;
+            DROP INDEX IF EXISTS idx_on_search_view_trigram;
+            DROP MATERIALIZED VIEW IF EXISTS terms_based_view CASCADE;
+
+            CREATE MATERIALIZED VIEW terms_based_view AS
+              SELECT
+                l.refset_id                                            AS lang_refset_refset_id,
+                l.acceptability_id                                     AS lang_refset_acceptability_id,
+
+                d.id                                                   AS description_id,
+                d.language_code                                        AS description_language_code,
+                d.type_id                                              AS description_type_id,
+                d.case_significance_id                                 AS description_case_significance_id,
+                d.term                                                 AS description_term,
+
+                c.id                                                   AS concept_id,
+                c.active                                               AS concpet_active,
+                c.definition_status_id                                 AS concpet_definition_status_id,
+                cc.semantic_tag                                        AS concept_semantic_tag,
+                cc.top_level_concept_id                                AS concept_top_level_id,
+
+                setweight(to_tsvector(get_lang_type(d.language_code), unaccent(d.term)),
+                          get_priority(d.type_id, l.acceptability_id)) ||
+                setweight(to_tsvector('simple', unaccent(d.term)), 'A') AS search_term
+              FROM sct2_lang_refset l
+                LEFT JOIN sct2_description d ON d.id = l.referenced_component_id
+                LEFT JOIN sct2_concept c ON c.id = d.concept_id
+                LEFT JOIN concept_classification_view cc ON cc.concept_id = d.concept_id
+              WHERE l.active = TRUE AND d.active = TRUE;
+
+
+            CREATE INDEX idx_on_search_view ON terms_based_view USING GIN (search_term);
+            CREATE INDEX idx_on_terms_based_view ON terms_based_view (description_term);
+            CREATE INDEX idx_on_search_view_semantic_tag ON terms_based_view USING GIN (concept_semantic_tag, search_term);
+            CREATE INDEX idx_on_search_view_top_level ON terms_based_view USING GIN (concept_top_level_id, search_term);
+        """)
+    ]
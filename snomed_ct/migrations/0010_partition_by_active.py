@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# Needs PostgreSQL 11 or newer for primary keys and indexes of partitioned tables
+PARTITIONED_TABLES = (
+    ('sct2_description', 'id, effective_time, active'),
+    ('sct2_relationship', 'id, effective_time, active'),
+    ('sct2_stated_relationship', 'id, effective_time, active'),
+    ('sct2_lang_refset', 'id'),
+    ('sct2_association_refset', 'id'),
+    ('sct2_attribute_value_refset', 'id'),
+    ('sct2_simple_refset', 'id'),
+    ('sct2_simple_map_refset', 'id'),
+    ('sct2_complex_map_refset', 'id'),
+    ('sct2_extended_map_refset', 'id'),
+)
+
+# Primary key of partitioned table has to include the partition key
+PARTITIONED_PRIMARY_KEY = 'id, effective_time, active'
+
+TABLE_NAMES = "ARRAY[%s]" % ', '.join("'%s'" % table for table, _ in PARTITIONED_TABLES)
+
+
+def repartition_sql(partitioned):
+    return '\n'.join("SELECT snomed_ct_repartition_table('%s', %s, '%s');" % (
+        table, 'TRUE' if partitioned else 'FALSE', PARTITIONED_PRIMARY_KEY if partitioned else primary_key)
+                     for table, primary_key in PARTITIONED_TABLES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snomed_ct', '0009_fuzzy_search'),
+    ]
+
+    operations = [
+        migrations.RunSQL("""
+            -- Saves definitions and indexes of materialized views depending on given tables, then drops them
+            CREATE OR REPLACE FUNCTION snomed_ct_save_views(table_names TEXT [])
+              RETURNS VOID
+            LANGUAGE plpgsql
+            AS $$
+            DECLARE
+              saved RECORD;
+            BEGIN
+              CREATE TABLE IF NOT EXISTS snomed_ct_saved_view (
+                name       TEXT PRIMARY KEY,
+                position   BIGINT NOT NULL,
+                definition TEXT NOT NULL,
+                populated  BOOLEAN NOT NULL,
+                indexes    TEXT [] NOT NULL
+              );
+
+              INSERT INTO snomed_ct_saved_view
+                WITH RECURSIVE dependent(oid) AS (
+                  SELECT r.ev_class
+                  FROM pg_depend d
+                    JOIN pg_rewrite r ON r.oid = d.objid
+                  WHERE d.refobjid = ANY (SELECT t :: REGCLASS :: OID FROM unnest(table_names) t)
+                  UNION
+                  SELECT r.ev_class
+                  FROM dependent v
+                    JOIN pg_depend d ON d.refobjid = v.oid
+                    JOIN pg_rewrite r ON r.oid = d.objid
+                  WHERE r.ev_class <> v.oid
+                )
+                SELECT m.matviewname, c.oid :: BIGINT, m.definition, m.ispopulated,
+                  ARRAY(SELECT i.indexdef FROM pg_indexes i
+                        WHERE i.schemaname = m.schemaname AND i.tablename = m.matviewname)
+                FROM dependent v
+                  JOIN pg_class c ON c.oid = v.oid
+                  JOIN pg_matviews m ON m.matviewname = c.relname AND m.schemaname = current_schema()
+              ON CONFLICT (name) DO NOTHING;
+
+              FOR saved IN SELECT * FROM snomed_ct_saved_view ORDER BY position DESC LOOP
+                EXECUTE format('DROP MATERIALIZED VIEW IF EXISTS %I', saved.name);
+              END LOOP;
+            END
+            $$;
+
+            -- Recreates materialized views saved by snomed_ct_save_views in their original order
+            CREATE OR REPLACE FUNCTION snomed_ct_restore_views()
+              RETURNS VOID
+            LANGUAGE plpgsql
+            AS $$
+            DECLARE
+              saved RECORD;
+              index_definition TEXT;
+            BEGIN
+              FOR saved IN SELECT * FROM snomed_ct_saved_view ORDER BY position LOOP
+                EXECUTE format('CREATE MATERIALIZED VIEW %I AS %s WITH %s DATA', saved.name,
+                               rtrim(saved.definition, '; ' || chr(10)), CASE WHEN saved.populated THEN '' ELSE 'NO' END);
+                FOREACH index_definition IN ARRAY saved.indexes LOOP
+                  EXECUTE index_definition;
+                END LOOP;
+              END LOOP;
+              DROP TABLE snomed_ct_saved_view;
+            END
+            $$;
+
+            -- Rebuilds table as LIST (active) partitioned or plain one, keeping its data and secondary indexes
+            CREATE OR REPLACE FUNCTION snomed_ct_repartition_table(table_name TEXT, partitioned BOOLEAN,
+                                                                   primary_key TEXT)
+              RETURNS VOID
+            LANGUAGE plpgsql
+            AS $$
+            DECLARE
+              index_definitions TEXT [];
+              index_definition TEXT;
+            BEGIN
+              SELECT array_agg(i.indexdef) INTO index_definitions
+              FROM pg_indexes i
+              WHERE i.schemaname = current_schema() AND i.tablename = table_name
+                AND i.indexname <> table_name || '_pkey';
+
+              IF partitioned THEN
+                EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS) PARTITION BY LIST (active)',
+                               table_name || '_new', table_name);
+                EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES IN (TRUE)',
+                               table_name || '_active', table_name || '_new');
+                EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES IN (FALSE)',
+                               table_name || '_inactive', table_name || '_new');
+              ELSE
+                EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS)', table_name || '_new', table_name);
+              END IF;
+
+              EXECUTE format('INSERT INTO %I SELECT * FROM %I', table_name || '_new', table_name);
+              EXECUTE format('DROP TABLE %I', table_name);
+              EXECUTE format('ALTER TABLE %I RENAME TO %I', table_name || '_new', table_name);
+              EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I PRIMARY KEY (%s)',
+                             table_name, table_name || '_pkey', primary_key);
+
+              FOREACH index_definition IN ARRAY coalesce(index_definitions, ARRAY [] :: TEXT []) LOOP
+                EXECUTE index_definition;
+              END LOOP;
+              EXECUTE format('ANALYZE %I', table_name);
+            END
+            $$;
+        """, """
+            DROP FUNCTION IF EXISTS snomed_ct_save_views(TEXT []);
+            DROP FUNCTION IF EXISTS snomed_ct_restore_views();
+            DROP FUNCTION IF EXISTS snomed_ct_repartition_table(TEXT, BOOLEAN, TEXT);
+        """),
+        migrations.RunSQL("""
+            SELECT snomed_ct_save_views(%(tables)s);
+            %(partition)s
+            SELECT snomed_ct_restore_views();
+        """ % {'tables': TABLE_NAMES, 'partition': repartition_sql(True)}, """
+            SELECT snomed_ct_save_views(%(tables)s);
+            %(partition)s
+            SELECT snomed_ct_restore_views();
+        """ % {'tables': TABLE_NAMES, 'partition': repartition_sql(False)}),
+    ]
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snomed_ct', '0011_immutable_search_functions'),
+    ]
+
+    operations = [
+        migrations.RunSQL("""
+            ------ Create View ------
+            -- One row per active concept and language reference set with everything a concept detail page
+            -- shows. Attribute groups are JSONB object of relationship group to [type_id, destination_id] pairs.
+            CREATE MATERIALIZED VIEW concept_summary_view AS
+              WITH is_a AS (
+                  SELECT r.source_id, r.destination_id
+                  FROM sct2_relationship r
+                  WHERE r.active = TRUE AND r.type_id = 116680003 AND r.characteristic_type_id <> 900000000000227009
+              ), parents AS (
+                  SELECT i.source_id AS concept_id, array_agg(i.destination_id ORDER BY i.destination_id) AS parent_ids
+                  FROM is_a i
+                  GROUP BY i.source_id
+              ), children AS (
+                  SELECT i.destination_id AS concept_id, count(*) AS child_count
+                  FROM is_a i
+                  GROUP BY i.destination_id
+              ), attribute_groups AS (
+                  SELECT g.source_id AS concept_id, jsonb_object_agg(g.relationship_group, g.attributes) AS attribute_groups
+                  FROM (
+                    SELECT r.source_id, r.relationship_group,
+                      jsonb_agg(jsonb_build_array(r.type_id, r.destination_id) ORDER BY r.type_id, r.destination_id)
+                        AS attributes
+                    FROM sct2_relationship r
+                    WHERE r.active = TRUE AND r.type_id <> 116680003 AND r.characteristic_type_id <> 900000000000227009
+                    GROUP BY r.source_id, r.relationship_group
+                  ) g
+                  GROUP BY g.source_id
+              ), refsets AS (
+                  SELECT s.referenced_component_id AS concept_id, array_agg(DISTINCT s.refset_id) AS refset_ids
+                  FROM sct2_simple_refset s
+                  WHERE s.active = TRUE
+                  GROUP BY s.referenced_component_id
+              ), terms AS (
+                  SELECT l.refset_id, d.concept_id,
+                    max(d.term) FILTER (WHERE d.type_id = 900000000000013009) AS preferred_term,
+                    max(d.term) FILTER (WHERE d.type_id = 900000000000003001) AS fully_specified_name
+                  FROM sct2_lang_refset l
+                    JOIN sct2_description d ON d.id = l.referenced_component_id
+                  WHERE l.active = TRUE AND d.active = TRUE AND l.acceptability_id = 900000000000548007
+                  GROUP BY l.refset_id, d.concept_id
+              ), text_definitions AS (
+                  SELECT DISTINCT ON (l.refset_id, t.concept_id) l.refset_id, t.concept_id, t.term
+                  FROM sct2_lang_refset l
+                    JOIN sct2_text_definition t ON t.id = l.referenced_component_id
+                  WHERE l.active = TRUE AND t.active = TRUE AND l.acceptability_id = 900000000000548007
+                  ORDER BY l.refset_id, t.concept_id, t.effective_time DESC
+              )
+              SELECT
+                c.id                                                   AS concept_id,
+                t.refset_id                                            AS lang_refset_refset_id,
+                t.preferred_term                                       AS preferred_term,
+                t.fully_specified_name                                 AS fully_specified_name,
+                cc.semantic_tag                                        AS semantic_tag,
+                cc.top_level_concept_id                                AS top_level_concept_id,
+                c.definition_status_id                                 AS definition_status_id,
+                coalesce(p.parent_ids, '{}')                           AS parent_ids,
+                coalesce(ch.child_count, 0)                            AS child_count,
+                coalesce(a.attribute_groups, '{}')                     AS attribute_groups,
+                coalesce(rs.refset_ids, '{}')                          AS refset_ids,
+                td.term                                                AS text_definition
+              FROM sct2_concept c
+                JOIN terms t ON t.concept_id = c.id
+                LEFT JOIN concept_classification_view cc ON cc.concept_id = c.id
+                LEFT JOIN parents p ON p.concept_id = c.id
+                LEFT JOIN children ch ON ch.concept_id = c.id
+                LEFT JOIN attribute_groups a ON a.concept_id = c.id
+                LEFT JOIN refsets rs ON rs.concept_id = c.id
+                LEFT JOIN text_definitions td ON td.concept_id = c.id AND td.refset_id = t.refset_id
+              WHERE c.active = TRUE;
+
+            CREATE UNIQUE INDEX idx_on_concept_summary_view ON concept_summary_view (concept_id, lang_refset_refset_id);
+        """, """
+            DROP INDEX IF EXISTS idx_on_concept_summary_view;
+            DROP MATERIALIZED VIEW IF EXISTS concept_summary_view CASCADE;
+        """)
+    ]
@@ -1,18 +1,37 @@
 from __future__ import unicode_literals
 
+from django.contrib.postgres.fields import ArrayField, JSONField
 from django.core.cache import caches
 from django.db import models
 from django.utils.encoding import python_2_unicode_compatible
 from model_utils.choices import Choices
 
 from pgsearch.fields import TSVectorField
-from pgsearch.managers import ReadOnlySearchManager
 
-
-from .manager import SNOMEDCTModelManager
+from .manager import ConceptSummaryManager, DefiningRelationshipManager, HistoricalResolutionManager, \
+    SNOMEDCTModelManager, TermSearchManager
+from .metrics import instrumented, record_cache, register_cache
 
 # Get the cache shortcut
 cache = caches['snomed_ct']
+TERM_CACHE = register_cache('terms')
+
+
+def get_fully_specified_name_key(concept_id):
+    return "fsn_%d" % concept_id
+
+
+def get_preferred_term_key(concept_id):
+    return "pt_%d" % concept_id
+
+
+def get_cached_term(key, default):
+    term = cache.get(key)
+    record_cache(TERM_CACHE, term is not None)
+    if term is None:
+        term = default()
+        cache.add(key, term, None)
+    return term
 
 
 ###################
@@ -47,6 +66,7 @@ class Concept(BaseSNOMEDCTModel):
                                           related_name='+', db_index=False)
 
     objects = SNOMEDCTModelManager()
+    active_objects = SNOMEDCTModelManager(active_only=True)
 
     class Meta:
         managed = False
@@ -70,11 +90,17 @@ class Concept(BaseSNOMEDCTModel):
             lang_refset__refset=getattr(LangRefSet.REFSET_CHOICES, lang)
         )
 
+    @instrumented('concept.get_fully_specified_name')
     def get_fully_specified_name(self, lang="en_us"):
-        return cache.get_or_set("fsn_%d" % self.id, lambda: self.__get_fully_specified_name(lang), None)
+        return get_cached_term(get_fully_specified_name_key(self.id), lambda: self.__get_fully_specified_name(lang))
 
+    @instrumented('concept.get_preferred_term')
     def get_preferred_term(self, lang="en_us"):
-        return cache.get_or_set("pt_%d" % self.id, lambda: self.__get_preferred_term(lang), None)
+        return get_cached_term(get_preferred_term_key(self.id), lambda: self.__get_preferred_term(lang))
+
+    @instrumented('concept.get_summary')
+    def get_summary(self, lang="en_us"):
+        return ConceptSummary.objects.get_summary(self.id, lang)
 
 
 @python_2_unicode_compatible
@@ -101,6 +127,7 @@ class Description(BaseSNOMEDCTModel):
                                           related_name='case_significance_descriptions', db_index=False)
 
     objects = SNOMEDCTModelManager()
+    active_objects = SNOMEDCTModelManager(active_only=True)
 
     class Meta:
         managed = False
@@ -124,6 +151,7 @@ class TextDefinition(BaseSNOMEDCTModel):
     case_significance = models.ForeignKey(Concept, on_delete=models.PROTECT, related_name='+')
 
     objects = SNOMEDCTModelManager()
+    active_objects = SNOMEDCTModelManager(active_only=True)
 
     class Meta:
         managed = False
@@ -249,7 +277,8 @@ class Relationship(BaseSNOMEDCTModel):
                                             related_name='+')
     modifier = models.ForeignKey(Concept, on_delete=models.PROTECT, related_name='+')
 
-    objects = SNOMEDCTModelManager()
+    objects = DefiningRelationshipManager()
+    active_objects = DefiningRelationshipManager(active_only=True)
 
     class Meta:
         managed = False
@@ -270,7 +299,8 @@ class StatedRelationship(BaseSNOMEDCTModel):
     characteristic_type = models.ForeignKey(Concept, on_delete=models.PROTECT, related_name='+')
     modifier = models.ForeignKey(Concept, on_delete=models.PROTECT, related_name='+')
 
-    objects = SNOMEDCTModelManager()
+    objects = DefiningRelationshipManager()
+    active_objects = DefiningRelationshipManager(active_only=True)
 
     class Meta:
         managed = False
@@ -308,6 +338,7 @@ class LangRefSet(BaseSNOMEDCTModel):
                                       related_name='+')
 
     objects = SNOMEDCTModelManager()
+    active_objects = SNOMEDCTModelManager(active_only=True)
 
     class Meta:
         managed = False
@@ -318,15 +349,28 @@ class LangRefSet(BaseSNOMEDCTModel):
 
 # @python_2_unicode_compatible
 class AssociationRefSet(BaseSNOMEDCTModel):
+    REFSET_CHOICES = Choices(
+        # Historical associations
+        (900000000000527005, 'same_as', 'SAME AS'),
+        (900000000000526001, 'replaced_by', 'REPLACED BY'),
+        (900000000000523009, 'possibly_equivalent_to', 'POSSIBLY EQUIVALENT TO'),
+        (900000000000528000, 'was_a', 'WAS A'),
+        (900000000000530003, 'alternative', 'ALTERNATIVE'),
+        (900000000000524003, 'moved_to', 'MOVED TO'),
+        (900000000000525002, 'moved_from', 'MOVED FROM'),
+        (900000000000531004, 'refers_to', 'REFERS TO'),
+    )
+
     id = models.TextField(primary_key=True)
     effective_time = models.DateField()
     active = models.BooleanField()
     module = models.ForeignKey(Concept, on_delete=models.PROTECT, related_name='+')
-    refset = models.ForeignKey(Concept, on_delete=models.PROTECT, related_name='+')
+    refset = models.ForeignKey(Concept, on_delete=models.PROTECT, choices=REFSET_CHOICES, related_name='+')
     referenced_component = models.ForeignKey(Concept, on_delete=models.PROTECT, related_name='+')
     target_component = models.ForeignKey(Concept, on_delete=models.PROTECT, related_name='+')
 
     objects = SNOMEDCTModelManager()
+    active_objects = SNOMEDCTModelManager(active_only=True)
 
     class Meta:
         managed = False
@@ -344,6 +388,7 @@ class AttributeValueRefSet(BaseSNOMEDCTModel):
     value = models.ForeignKey(Concept, on_delete=models.PROTECT, related_name='+')
 
     objects = SNOMEDCTModelManager()
+    active_objects = SNOMEDCTModelManager(active_only=True)
 
     class Meta:
         managed = False
@@ -360,6 +405,7 @@ class SimpleRefSet(BaseSNOMEDCTModel):
     referenced_component = models.ForeignKey(Concept, on_delete=models.PROTECT, related_name='+')
 
     objects = SNOMEDCTModelManager()
+    active_objects = SNOMEDCTModelManager(active_only=True)
 
     class Meta:
         managed = False
@@ -384,6 +430,7 @@ class ComplexMapRefSet(BaseSNOMEDCTModel):
     correlation = models.ForeignKey(Concept, on_delete=models.PROTECT, related_name='+')
 
     objects = SNOMEDCTModelManager()
+    active_objects = SNOMEDCTModelManager(active_only=True)
 
     class Meta:
         managed = False
@@ -407,6 +454,7 @@ class ExtendedMapRefSet(BaseSNOMEDCTModel):
     map_category = models.ForeignKey(Concept, on_delete=models.PROTECT, related_name='+', blank=True, null=True)
 
     objects = SNOMEDCTModelManager()
+    active_objects = SNOMEDCTModelManager(active_only=True)
 
     class Meta:
         managed = False
@@ -424,6 +472,7 @@ class SimpleMapRefSet(BaseSNOMEDCTModel):
     map_target = models.TextField()
 
     objects = SNOMEDCTModelManager()
+    active_objects = SNOMEDCTModelManager(active_only=True)
 
     class Meta:
         managed = False
@@ -435,6 +484,28 @@ class SimpleMapRefSet(BaseSNOMEDCTModel):
 #############################
 
 
+@python_2_unicode_compatible
+class ConceptClassificationView(models.Model):
+    concept = models.OneToOneField(Concept, on_delete=models.PROTECT, related_name='classification', primary_key=True)
+    semantic_tag = models.CharField(max_length=255, blank=True, null=True)
+    top_level_concept = models.ForeignKey(Concept, on_delete=models.PROTECT, related_name='+', blank=True, null=True)
+
+    objects = SNOMEDCTModelManager()
+
+    class Meta:
+        managed = False
+        db_table = 'concept_classification_view'
+
+    def __str__(self):
+        return "SCTID:%d (%s)" % (self.concept_id, self.semantic_tag)
+
+    def save(self, *args, **kwargs):
+        raise NotImplementedError
+
+    def delete(self, *args, **kwargs):
+        raise NotImplementedError
+
+
 @python_2_unicode_compatible
 class TermBasedView(models.Model):
     lang_refset_refset = models.ForeignKey(Concept, on_delete=models.PROTECT, choices=LangRefSet.REFSET_CHOICES, related_name='+', primary_key=True)
@@ -447,9 +518,13 @@ class TermBasedView(models.Model):
     concept = models.ForeignKey(Concept, on_delete=models.PROTECT, related_name='+')
     concpet_active = models.BooleanField()
     concpet_definition_status = models.ForeignKey(Concept, on_delete=models.PROTECT, choices=Concept.DEFINITION_STATUS_CHOICES, related_name='+')
+    concept_semantic_tag = models.CharField(max_length=255, blank=True, null=True)
+    concept_top_level = models.ForeignKey(Concept, on_delete=models.PROTECT, related_name='+', blank=True, null=True)
+    description_search_text = models.CharField(max_length=255)
+    description_priority = models.CharField(max_length=1)
     search_term = TSVectorField()
 
-    objects = ReadOnlySearchManager(
+    objects = TermSearchManager(
         search_field='search_term'
     )
 
@@ -466,3 +541,61 @@ class TermBasedView(models.Model):
     def delete(self, *args, **kwargs):
         raise NotImplementedError
 
+
+@python_2_unicode_compatible
+class ConceptSummary(models.Model):
+    # Not a real key, the view has a row per concept and language reference set. Django needs a primary key,
+    # so get(pk=...), in_bulk() and instance equality only work within objects.for_lang() of one language.
+    concept = models.ForeignKey(Concept, on_delete=models.PROTECT, related_name='+', primary_key=True)
+    lang_refset_refset = models.ForeignKey(Concept, on_delete=models.PROTECT, choices=LangRefSet.REFSET_CHOICES, related_name='+')
+    preferred_term = models.CharField(max_length=255, blank=True, null=True)
+    fully_specified_name = models.CharField(max_length=255, blank=True, null=True)
+    semantic_tag = models.CharField(max_length=255, blank=True, null=True)
+    top_level_concept = models.ForeignKey(Concept, on_delete=models.PROTECT, related_name='+', blank=True, null=True)
+    definition_status = models.ForeignKey(Concept, on_delete=models.PROTECT, choices=Concept.DEFINITION_STATUS_CHOICES, related_name='+')
+    parent_ids = ArrayField(models.BigIntegerField())
+    child_count = models.IntegerField()
+    attribute_groups = JSONField()
+    refset_ids = ArrayField(models.BigIntegerField())
+    text_definition = models.TextField(blank=True, null=True)
+
+    objects = ConceptSummaryManager()
+
+    class Meta:
+        managed = False
+        db_table = 'concept_summary_view'
+        unique_together = (('concept', 'lang_refset_refset'),)
+
+    def __str__(self):
+        return "SCTID:%d (%s)" % (self.concept_id, self.preferred_term)
+
+    def save(self, *args, **kwargs):
+        raise NotImplementedError
+
+    def delete(self, *args, **kwargs):
+        raise NotImplementedError
+
+
+@python_2_unicode_compatible
+class HistoricalResolutionView(models.Model):
+    # Not a real key, inactive concept with several targets has a row per target. Use objects.resolve() rather
+    # than get(pk=...) or in_bulk(), which assume a single row per concept.
+    concept = models.ForeignKey(Concept, on_delete=models.PROTECT, related_name='+', primary_key=True)
+    target_concept = models.ForeignKey(Concept, on_delete=models.PROTECT, related_name='+')
+    depth = models.SmallIntegerField()
+    exact = models.BooleanField()
+
+    objects = HistoricalResolutionManager()
+
+    class Meta:
+        managed = False
+        db_table = 'historical_resolution_view'
+
+    def __str__(self):
+        return "SCTID:%d -> SCTID:%d" % (self.concept_id, self.target_concept_id)
+
+    def save(self, *args, **kwargs):
+        raise NotImplementedError
+
+    def delete(self, *args, **kwargs):
+        raise NotImplementedError
@@ -0,0 +1,180 @@
+from __future__ import unicode_literals
+import pickle
+from array import array
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import router
+
+from .models import Concept, Description, LangRefSet
+from .release import get_release_version
+from .utils import TOKEN_RE, chunked, normalise_term, stream_query, tokenise
+
+FULLY_SPECIFIED_NAME = 'fully_specified_name'
+PREFERRED_TERM = 'preferred_term'
+SYNONYM = 'synonym'
+
+Match = namedtuple('Match', ('start', 'end', 'concept_id', 'description_type'))
+
+_worker_recogniser = None
+
+
+def _init_worker(recogniser):
+    global _worker_recogniser
+    _worker_recogniser = recogniser
+
+
+def _worker_recognise(args):
+    documents, longest = args
+    return [_worker_recogniser.recognise(document, longest) for document in documents]
+
+
+def get_description_type(type_id, acceptability_id):
+    if type_id == Description.TYPE_CHOICES.fully_specified_name:
+        return FULLY_SPECIFIED_NAME
+    elif acceptability_id == LangRefSet.ACCEPTABILITY_CHOICES.preferred:
+        return PREFERRED_TERM
+    return SYNONYM
+
+
+def strip_semantic_tag(term):
+    return term.rsplit(' (', 1)[0] if term.endswith(')') and ' (' in term else term
+
+
+class ConceptRecogniser(object):
+    """
+    Word level Aho-Corasick automaton over normalised tokens of descriptions, so text is scanned in a single pass
+    regardless of the number of terms. Transitions of all states are kept in one dict keyed by
+    token id << 32 | state, other per state data in flat arrays, which keeps the automaton compact to pickle.
+    """
+
+    def __init__(self, terms, release_version=None):
+        # terms: iterable of (concept_id, term, description_type)
+        self.release_version = release_version
+        self.vocabulary = {}
+        self.goto = {}
+        self.depth = array('I', [0])
+        outputs = {}
+
+        for concept_id, term, description_type in terms:
+            state = 0
+            for token in tokenise(term):
+                key = self.vocabulary.setdefault(token, len(self.vocabulary)) << 32 | state
+                next_state = self.goto.get(key)
+                if next_state is None:
+                    next_state = self.goto[key] = len(self.depth)
+                    self.depth.append(self.depth[state] + 1)
+                state = next_state
+            if state:
+                outputs.setdefault(state, set()).add((concept_id, description_type))
+        self.outputs = dict((state, tuple(sorted(output))) for state, output in outputs.items())
+
+        # Failure links in breadth first order, dictionary links point to the nearest failure state with output
+        self.fail = array('I', [0]) * len(self.depth)
+        self.dictionary = array('I', [0]) * len(self.depth)
+        for key, state in sorted(self.goto.items(), key=lambda item: self.depth[item[1]]):
+            parent, token_key = key & 0xffffffff, key >> 32 << 32
+            if parent:
+                fail = self.fail[parent]
+                while fail and token_key | fail not in self.goto:
+                    fail = self.fail[fail]
+                self.fail[state] = self.goto.get(token_key | fail, 0)
+            fail = self.fail[state]
+            self.dictionary[state] = fail if fail in self.outputs else self.dictionary[fail]
+
+    @classmethod
+    def from_database(cls, lang='en_us', using=None, synonyms=True, fully_specified_names=False):
+        """
+        Builds recogniser from active descriptions of active concepts in given language reference set.
+        Semantic tags are stripped from fully specified names.
+        """
+        rows = stream_query("""
+            SELECT d.concept_id, d.term, d.type_id, l.acceptability_id
+            FROM sct2_lang_refset l
+              JOIN sct2_description d ON d.id = l.referenced_component_id
+              JOIN sct2_concept c ON c.id = d.concept_id
+            WHERE l.active = TRUE AND d.active = TRUE AND c.active = TRUE AND l.refset_id = %s;
+        """, [getattr(LangRefSet.REFSET_CHOICES, lang)], using=using or router.db_for_read(Concept))
+
+        def terms():
+            for concept_id, term, type_id, acceptability_id in rows:
+                description_type = get_description_type(type_id, acceptability_id)
+                if description_type == FULLY_SPECIFIED_NAME:
+                    if fully_specified_names:
+                        yield concept_id, strip_semantic_tag(term), description_type
+                elif synonyms or description_type == PREFERRED_TERM:
+                    yield concept_id, term, description_type
+
+        return cls(terms(), get_release_version())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as recogniser_file:
+            return pickle.load(recogniser_file)
+
+    def save(self, path):
+        with open(path, 'wb') as recogniser_file:
+            pickle.dump(self, recogniser_file, pickle.HIGHEST_PROTOCOL)
+
+    def tokens(self, text):
+        # Tokens with character spans in the original text, normalisation may split a word into more tokens
+        for match in TOKEN_RE.finditer(text):
+            for token in TOKEN_RE.findall(normalise_term(match.group())):
+                yield token, match.start(), match.end()
+
+    def matches(self, text):
+        """
+        Yields every, possibly overlapping, Match of the text in a single pass.
+        """
+        goto, fail, dictionary, depth, outputs = self.goto, self.fail, self.dictionary, self.depth, self.outputs
+        spans, state = [], 0
+        for i, (token, start, end) in enumerate(self.tokens(text)):
+            spans.append(start)
+            token_id = self.vocabulary.get(token)
+            if token_id is None:
+                state = 0
+                continue
+
+            token_key = token_id << 32
+            while state and token_key | state not in goto:
+                state = fail[state]
+            state = goto.get(token_key | state, 0)
+
+            output_state = state if state in outputs else dictionary[state]
+            while output_state:
+                for concept_id, description_type in outputs[output_state]:
+                    yield Match(spans[i - depth[output_state] + 1], end, concept_id, description_type)
+                output_state = dictionary[output_state]
+
+    def recognise(self, text, longest=True):
+        """
+        Returns list of matches ordered by position. By default only the longest of overlapping matches are kept,
+        all concepts sharing the same term are returned.
+        """
+        matches = sorted(self.matches(text), key=lambda match: (match.start, -match.end))
+        if not longest:
+            return matches
+
+        result, covered_end, span = [], -1, None
+        for match in matches:
+            if (match.start, match.end) == span:
+                result.append(match)
+            elif match.start >= covered_end:
+                result.append(match)
+                span, covered_end = (match.start, match.end), match.end
+        return result
+
+    def recognise_documents(self, documents, longest=True, processes=None, chunk_size=100):
+        """
+        Recognises concepts in every document, returning list of match lists in document order. Chunks of
+        documents are spread over a process pool, the automaton is sent to every worker only once.
+        """
+        if processes == 1:
+            return [self.recognise(document, longest) for document in documents]
+
+        results = []
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(self,)) as executor:
+            for chunk_results in executor.map(_worker_recognise,
+                                              ((chunk, longest) for chunk in chunked(documents, chunk_size))):
+                results.extend(chunk_results)
+        return results
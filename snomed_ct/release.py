@@ -0,0 +1,22 @@
+from __future__ import unicode_literals
+
+from django.db.models import Max
+
+from .models import Concept, cache
+
+RELEASE_VERSION_CACHE_KEY = 'release_version'
+
+
+def get_release_version():
+    """
+    Returns effective time of the loaded release as YYYYMMDD string, cached until the next release load.
+    """
+    def get_version():
+        effective_time = Concept.objects.aggregate(effective_time=Max('effective_time'))['effective_time']
+        return effective_time.strftime('%Y%m%d') if effective_time else None
+
+    return cache.get_or_set(RELEASE_VERSION_CACHE_KEY, get_version, None)
+
+
+def clear_release_version():
+    cache.delete(RELEASE_VERSION_CACHE_KEY)
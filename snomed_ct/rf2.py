@@ -0,0 +1,155 @@
+from __future__ import unicode_literals
+import os
+import re
+from collections import namedtuple
+
+from .exceptions import SNOMEDCTReleaseError
+
+RF2File = namedtuple('RF2File', ('label', 'table', 'columns', 'directory', 'file_name', 'copy_options'))
+
+RF2_FILES = (
+    RF2File('concept', 'sct2_concept',
+            ('id', 'effective_time', 'active', 'module_id', 'definition_status_id'),
+            ('Terminology',), 'sct2_Concept_%(type)s_%(edition)s_%(date)s.txt', ""),
+    RF2File('description', 'sct2_description',
+            ('id', 'effective_time', 'active', 'module_id', 'concept_id', 'language_code', 'type_id', 'term',
+             'case_significance_id'),
+            ('Terminology',), 'sct2_Description_%(type)s-en_%(edition)s_%(date)s.txt', ", QUOTE E'\b'"),
+    RF2File('text definition', 'sct2_text_definition',
+            ('id', 'effective_time', 'active', 'module_id', 'concept_id', 'language_code', 'type_id', 'term',
+             'case_significance_id'),
+            ('Terminology',), 'sct2_TextDefinition_%(type)s-en_%(edition)s_%(date)s.txt', ""),
+    RF2File('relationship', 'sct2_relationship',
+            ('id', 'effective_time', 'active', 'module_id', 'source_id', 'destination_id', 'relationship_group',
+             'type_id', 'characteristic_type_id', 'modifier_id'),
+            ('Terminology',), 'sct2_Relationship_%(type)s_%(edition)s_%(date)s.txt', ""),
+    RF2File('stated relationship', 'sct2_stated_relationship',
+            ('id', 'effective_time', 'active', 'module_id', 'source_id', 'destination_id', 'relationship_group',
+             'type_id', 'characteristic_type_id', 'modifier_id'),
+            ('Terminology',), 'sct2_StatedRelationship_%(type)s_%(edition)s_%(date)s.txt', ""),
+    RF2File('language reference set', 'sct2_lang_refset',
+            ('id', 'effective_time', 'active', 'module_id', 'refset_id', 'referenced_component_id',
+             'acceptability_id'),
+            ('Refset', 'Language'), 'der2_cRefset_Language%(type)s-en_%(edition)s_%(date)s.txt', ""),
+    RF2File('association reference set', 'sct2_association_refset',
+            ('id', 'effective_time', 'active', 'module_id', 'refset_id', 'referenced_component_id',
+             'target_component_id'),
+            ('Refset', 'Content'), 'der2_cRefset_AssociationReference%(type)s_%(edition)s_%(date)s.txt', ""),
+    RF2File('simple reference set', 'sct2_simple_refset',
+            ('id', 'effective_time', 'active', 'module_id', 'refset_id', 'referenced_component_id'),
+            ('Refset', 'Content'), 'der2_Refset_Simple%(type)s_%(edition)s_%(date)s.txt', ""),
+    RF2File('attribute value reference set', 'sct2_attribute_value_refset',
+            ('id', 'effective_time', 'active', 'module_id', 'refset_id', 'referenced_component_id', 'value_id'),
+            ('Refset', 'Content'), 'der2_cRefset_AttributeValue%(type)s_%(edition)s_%(date)s.txt', ""),
+    RF2File('simple map reference set', 'sct2_simple_map_refset',
+            ('id', 'effective_time', 'active', 'module_id', 'refset_id', 'referenced_component_id', 'map_target'),
+            ('Refset', 'Map'), 'der2_sRefset_SimpleMap%(type)s_%(edition)s_%(date)s.txt', ""),
+    RF2File('complex map reference set', 'sct2_complex_map_refset',
+            ('id', 'effective_time', 'active', 'module_id', 'refset_id', 'referenced_component_id', 'map_group',
+             'map_priority', 'map_rule', 'map_advice', 'map_target', 'correlation_id'),
+            ('Refset', 'Map'), 'der2_iissscRefset_ComplexMap%(type)s_%(edition)s_%(date)s.txt', ""),
+    RF2File('extended map reference set', 'sct2_extended_map_refset',
+            ('id', 'effective_time', 'active', 'module_id', 'refset_id', 'referenced_component_id', 'map_group',
+             'map_priority', 'map_rule', 'map_advice', 'map_target', 'correlation_id', 'map_category_id'),
+            ('Refset', 'Map'), 'der2_iisssccRefset_ExtendedMap%(type)s_%(edition)s_%(date)s.txt', ""),
+)
+
+# Columns of reference set members pointing to other components
+REFERENCE_COLUMNS = ('referenced_component_id', 'target_component_id')
+
+# Tables of components reference set members can point to
+COMPONENT_TABLES = ('sct2_concept', 'sct2_description', 'sct2_text_definition')
+
+RF2_DIRECTORIES = (('Terminology',), ('Refset', 'Language'), ('Refset', 'Content'), ('Refset', 'Map'))
+
+
+def get_rf2_file(table):
+    for rf2_file in RF2_FILES:
+        if rf2_file.table == table:
+            return rf2_file
+    raise KeyError(table)
+
+
+def get_file_path(rf2_file, location, release_date, release_type='Snapshot', edition='INT'):
+    return os.path.join(location, *rf2_file.directory + (rf2_file.file_name % {
+        'type': release_type, 'date': release_date, 'edition': edition},))
+
+
+def get_header(rf2_file):
+    # RF2 column names are camel case versions of table columns, e.g. definition_status_id -> definitionStatusId
+    return [column.split('_')[0] + ''.join(part.title() for part in column.split('_')[1:])
+            for column in rf2_file.columns]
+
+
+def get_copy_sql(rf2_file, table=None, source='%s'):
+    return """
+    COPY %s(%s)
+    FROM %s WITH(FORMAT CSV, HEADER TRUE, DELIMITER '\t'%s);
+    """ % (table or rf2_file.table, ', '.join(rf2_file.columns), source, rf2_file.copy_options)
+
+
+def filter_rf2_file(path, rf2_file, active_only=False, modules=None, refsets=None):
+    """
+    Yields raw lines of RF2 file, header included, matching given filters. Lines are neither decoded nor fully
+    split, so unwanted rows are dropped at the cost of a partial split per row before they reach COPY.
+    """
+    conditions = []
+    if active_only:
+        conditions.append((rf2_file.columns.index('active'), {b'1'}))
+    if modules:
+        conditions.append((rf2_file.columns.index('module_id'), {str(module).encode('ascii') for module in modules}))
+    if refsets and 'refset_id' in rf2_file.columns:
+        conditions.append((rf2_file.columns.index('refset_id'), {str(refset).encode('ascii') for refset in refsets}))
+
+    with open(path, 'rb') as rf2:
+        yield next(rf2, b'')
+        if not conditions:
+            for line in rf2:
+                yield line
+            return
+
+        last_column = max(column for column, _ in conditions)
+        for line in rf2:
+            fields = line.split(b'\t', last_column + 1)
+            if all(fields[column] in values for column, values in conditions):
+                yield line
+
+
+def get_delete_dangling_sql(rf2_file):
+    """
+    Returns SQL deleting reference set members pointing to components which were not loaded, None for files
+    without component references.
+    """
+    columns = [column for column in REFERENCE_COLUMNS if column in rf2_file.columns]
+    if not columns:
+        return None
+    return """
+    DELETE FROM %s t
+    WHERE %s;
+    """ % (rf2_file.table, '\n      OR '.join('(%s)' % ' AND '.join(
+        'NOT EXISTS (SELECT 1 FROM %s x WHERE x.id = t.%s)' % (table, column) for table in COMPONENT_TABLES)
+        for column in columns))
+
+
+def get_export_sql(rf2_file, conditions=''):
+    # Dates and booleans are formatted the RF2 way, header is written separately as it is camel cased
+    columns = [{'effective_time': "to_char(effective_time, 'YYYYMMDD')", 'active': 'active :: INT'}.get(column, column)
+               for column in rf2_file.columns]
+    return """
+    COPY (SELECT %s FROM %s %s ORDER BY id)
+    TO STDOUT WITH(FORMAT CSV, DELIMITER '\t', QUOTE E'\b');
+    """ % (', '.join(columns), rf2_file.table, conditions)
+
+
+def discover_release_date(location):
+    release_date = None
+    for directory in RF2_DIRECTORIES:
+        for file_name in os.listdir(os.path.join(location, *directory)):
+            match = re.match(r'(sct2|der2)_[\w\-_]+(?P<date>\d{8})\.txt', file_name)
+
+            if not release_date:
+                release_date = match.group('date')
+            elif release_date != match.group('date'):
+                raise SNOMEDCTReleaseError("Release files date mismatch. "
+                                           "Some of the release files are from different release then the others.")
+    return release_date
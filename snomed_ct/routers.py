@@ -0,0 +1,56 @@
+from __future__ import unicode_literals
+import random
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+def get_write_database():
+    return getattr(settings, 'SNOMED_CT_WRITE_DATABASE', DEFAULT_DB_ALIAS)
+
+
+def get_read_databases():
+    return getattr(settings, 'SNOMED_CT_READ_DATABASES', None) or [get_write_database()]
+
+
+def replica_databases(base, hosts, alias='snomed_ct_replica_%d', conn_max_age=600, pgbouncer=False):
+    """
+    Builds DATABASES entries for terminology read replicas out of the base database settings.
+    Connections are persistent for conn_max_age seconds; with pgbouncer=True server side cursors are disabled,
+    as they do not survive transaction pooling.
+    """
+    databases = {}
+    for i, host in enumerate(hosts):
+        database = dict(base, HOST=host, CONN_MAX_AGE=conn_max_age)
+        if pgbouncer:
+            database['DISABLE_SERVER_SIDE_CURSORS'] = True
+        databases[alias % i] = database
+    return databases
+
+
+class SNOMEDCTRouter(object):
+    """
+    Sends reads of snomed_ct models to a random one of SNOMED_CT_READ_DATABASES and writes and migrations
+    to SNOMED_CT_WRITE_DATABASE (default database by default).
+    """
+    app_label = 'snomed_ct'
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == self.app_label:
+            return random.choice(get_read_databases())
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == self.app_label:
+            return get_write_database()
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._meta.app_label == self.app_label and obj2._meta.app_label == self.app_label:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label == self.app_label:
+            return db == get_write_database()
+        return None
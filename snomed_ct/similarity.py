@@ -0,0 +1,175 @@
+from __future__ import unicode_literals
+import math
+import pickle
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import router
+
+from .hierarchy import IS_A_CONDITION, ROOT_CONCEPT_ID
+from .models import Relationship
+from .utils import chunked, stream_query
+
+MEASURES = ('resnik', 'lin', 'path', 'lca')
+
+_worker_graph = None
+
+
+def _init_worker(graph):
+    global _worker_graph
+    _worker_graph = graph
+
+
+def _worker_similarities(args):
+    pairs, measure = args
+    return _worker_graph.similarities(pairs, measure)
+
+
+class IsAGraph(object):
+    """
+    In memory is-a hierarchy with precomputed depth and intrinsic information content
+    (Seco: 1 - log(descendants + 1) / log(concepts)) of every concept.
+    """
+
+    def __init__(self, edges, root_id=ROOT_CONCEPT_ID):
+        # edges: iterable of (child_id, parent_id)
+        parents = {}
+        for child_id, parent_id in edges:
+            parents.setdefault(child_id, []).append(parent_id)
+            parents.setdefault(parent_id, [])
+
+        self.concept_ids = array('q', sorted(parents))
+        self.index = dict((concept_id, i) for i, concept_id in enumerate(self.concept_ids))
+        self.parents = [tuple(self.index[parent_id] for parent_id in parents[concept_id])
+                        for concept_id in self.concept_ids]
+        self.root = self.index.get(root_id)
+
+        children = [[] for _ in self.concept_ids]
+        for i, concept_parents in enumerate(self.parents):
+            for parent in concept_parents:
+                children[parent].append(i)
+
+        # Depth is the length of the shortest is-a path from the root
+        self.depth = array('i', [-1]) * len(self.concept_ids)
+        if self.root is not None:
+            self.depth[self.root] = 0
+            queue = deque([self.root])
+            while queue:
+                i = queue.popleft()
+                for child in children[i]:
+                    if self.depth[child] < 0:
+                        self.depth[child] = self.depth[i] + 1
+                        queue.append(child)
+
+        descendants = array('I', [0]) * len(self.concept_ids)
+        for i in range(len(self.concept_ids)):
+            for ancestor in self.ancestors(i):
+                if ancestor != i:
+                    descendants[ancestor] += 1
+
+        total = math.log(len(self.concept_ids)) if len(self.concept_ids) > 1 else 1.0
+        self.information_content = array('d', (1.0 - math.log(count + 1) / total for count in descendants))
+
+    @classmethod
+    def from_database(cls, using=None, **kwargs):
+        return cls(stream_query("""
+            SELECT r.source_id, r.destination_id FROM sct2_relationship r WHERE %s;
+        """ % IS_A_CONDITION, using=using or router.db_for_read(Relationship)), **kwargs)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as graph_file:
+            return pickle.load(graph_file)
+
+    def save(self, path):
+        with open(path, 'wb') as graph_file:
+            pickle.dump(self, graph_file, pickle.HIGHEST_PROTOCOL)
+
+    def ancestors(self, i):
+        """
+        Returns dict of ancestor indexes (concept itself included) with their is-a distance.
+        """
+        distances = {i: 0}
+        queue = deque([i])
+        while queue:
+            current = queue.popleft()
+            for parent in self.parents[current]:
+                if parent not in distances:
+                    distances[parent] = distances[current] + 1
+                    queue.append(parent)
+        return distances
+
+    def get_depth(self, concept_id):
+        return self.depth[self.index[concept_id]]
+
+    def get_information_content(self, concept_id):
+        return self.information_content[self.index[concept_id]]
+
+    def __common(self, a, b, ancestors_cache):
+        for i in (a, b):
+            if i not in ancestors_cache:
+                ancestors_cache[i] = self.ancestors(i)
+        ancestors_a, ancestors_b = ancestors_cache[a], ancestors_cache[b]
+        if len(ancestors_a) > len(ancestors_b):
+            ancestors_a, ancestors_b = ancestors_b, ancestors_a
+        return [(i, ancestors_a[i], ancestors_b[i]) for i in ancestors_a if i in ancestors_b]
+
+    def __similarity(self, concept_a, concept_b, measure, ancestors_cache):
+        a, b = self.index.get(concept_a), self.index.get(concept_b)
+        if a is None or b is None:
+            return None
+
+        common = self.__common(a, b, ancestors_cache)
+        if not common:
+            return None
+
+        if measure == 'path':
+            return 1.0 / (1 + min(distance_a + distance_b for _, distance_a, distance_b in common))
+
+        # Most informative common ancestor, deeper one on ties
+        lca = max(common, key=lambda ancestor: (self.information_content[ancestor[0]], self.depth[ancestor[0]]))[0]
+        if measure == 'lca':
+            return self.concept_ids[lca]
+        if measure == 'resnik':
+            return self.information_content[lca]
+
+        denominator = self.information_content[a] + self.information_content[b]
+        return 2 * self.information_content[lca] / denominator if denominator else 1.0
+
+    def similarity(self, concept_a, concept_b, measure='lin'):
+        return self.__similarity(concept_a, concept_b, measure, {})
+
+    def lowest_common_ancestor(self, concept_a, concept_b):
+        return self.__similarity(concept_a, concept_b, 'lca', {})
+
+    def similarities(self, pairs, measure='lin'):
+        if measure not in MEASURES:
+            raise ValueError("Unknown similarity measure %s." % measure)
+
+        # Ancestor sets are shared between pairs of the same batch, as pairs tend to repeat concepts
+        ancestors_cache = {}
+        results = []
+        for concept_a, concept_b in pairs:
+            if len(ancestors_cache) > 100000:
+                ancestors_cache.clear()
+            results.append(self.__similarity(concept_a, concept_b, measure, ancestors_cache))
+        return results
+
+    def pairwise(self, pairs, measure='lin', processes=None, chunk_size=10000):
+        """
+        Batch similarity of (concept_a, concept_b) pairs, given as iterable or NumPy array of shape (n, 2).
+        Chunks of pairs are spread over a process pool, the graph is sent to every worker only once.
+        """
+        if hasattr(pairs, 'tolist'):
+            pairs = pairs.tolist()
+
+        if processes == 1:
+            return self.similarities(pairs, measure)
+
+        results = []
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(self,)) as executor:
+            for chunk_results in executor.map(_worker_similarities,
+                                              ((chunk, measure) for chunk in chunked(pairs, chunk_size))):
+                results.extend(chunk_results)
+        return results
@@ -0,0 +1,229 @@
+from __future__ import unicode_literals
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+from django.db import router
+
+from .hierarchy import IS_A_CONDITION
+from .models import Concept, Description, LangRefSet
+from .utils import stream_query
+
+MAGIC = b'SCTSNAP1'
+HEADER = struct.Struct('<8s8sI')
+SECTION = struct.Struct('<32scQQ')
+ALIGNMENT = 8
+
+ACTIVE = 1
+DEFINED = 2
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class SnapshotWriter(object):
+    """
+    Compiles loaded release into a snapshot file: fixed width arrays (concept ids, flags, term offsets,
+    is-a CSR graph, refset memberships) followed by one UTF-8 string heap.
+    """
+
+    def __init__(self, langs=None, refsets=(), using=None):
+        self.langs = langs or list(LangRefSet.REFSET_CHOICES._identifier_map)
+        self.refsets = refsets
+        self.using = using or router.db_for_read(Concept)
+        self.sections = []
+        self.heap = bytearray()
+        self.heap_offsets = {}
+
+    def add_string(self, value):
+        offset = self.heap_offsets.get(value)
+        if offset is None:
+            offset = self.heap_offsets[value] = len(self.heap)
+            self.heap.extend(value.encode('utf-8'))
+        return offset
+
+    def add_section(self, name, values):
+        self.sections.append((name, values))
+
+    def compile(self):
+        concept_ids, flags = array('q'), array('B')
+        for concept_id, active, definition_status_id in stream_query("""
+            SELECT id, active, definition_status_id FROM sct2_concept ORDER BY id;
+        """, using=self.using):
+            concept_ids.append(concept_id)
+            flags.append((ACTIVE if active else 0) |
+                         (DEFINED if definition_status_id == Concept.DEFINITION_STATUS_CHOICES.defined else 0))
+        index = dict((concept_id, i) for i, concept_id in enumerate(concept_ids))
+
+        self.add_section('concepts', concept_ids)
+        self.add_section('flags', flags)
+
+        for lang in self.langs:
+            # (heap offset, byte length) pairs per concept, zero length for missing terms
+            terms = {
+                Description.TYPE_CHOICES.synonym: array('I', [0]) * (2 * len(concept_ids)),
+                Description.TYPE_CHOICES.fully_specified_name: array('I', [0]) * (2 * len(concept_ids)),
+            }
+            for concept_id, type_id, term in stream_query("""
+                SELECT d.concept_id, d.type_id, d.term
+                FROM sct2_description d
+                  JOIN sct2_lang_refset l ON l.referenced_component_id = d.id
+                WHERE d.active = TRUE AND l.active = TRUE AND l.refset_id = %s AND l.acceptability_id = %s;
+            """, [getattr(LangRefSet.REFSET_CHOICES, lang), LangRefSet.ACCEPTABILITY_CHOICES.preferred],
+                    using=self.using):
+                i = index.get(concept_id)
+                if i is not None and type_id in terms:
+                    terms[type_id][2 * i] = self.add_string(term)
+                    terms[type_id][2 * i + 1] = len(term.encode('utf-8'))
+
+            self.add_section('pt.%s' % lang, terms[Description.TYPE_CHOICES.synonym])
+            self.add_section('fsn.%s' % lang, terms[Description.TYPE_CHOICES.fully_specified_name])
+
+        edges = [(index[source_id], index[destination_id]) for source_id, destination_id in stream_query("""
+            SELECT r.source_id, r.destination_id FROM sct2_relationship r WHERE %s;
+        """ % IS_A_CONDITION, using=self.using) if source_id in index and destination_id in index]
+
+        for name, key, value in (('parents', 0, 1), ('children', 1, 0)):
+            edges.sort(key=lambda edge: (edge[key], edge[value]))
+            offsets, targets = array('I', [0]) * (len(concept_ids) + 1), array('I')
+            for edge in edges:
+                offsets[edge[key] + 1] += 1
+                targets.append(edge[value])
+            for i in range(len(concept_ids)):
+                offsets[i + 1] += offsets[i]
+            self.add_section('%s.offsets' % name, offsets)
+            self.add_section(name, targets)
+
+        for refset_id in self.refsets:
+            members = sorted(set(index[concept_id] for concept_id, in stream_query("""
+                SELECT r.referenced_component_id FROM sct2_simple_refset r WHERE r.active = TRUE AND r.refset_id = %s;
+            """, [refset_id], using=self.using) if concept_id in index))
+            self.add_section('refset.%d' % refset_id, array('I', members))
+
+        self.add_section('heap', array('B', bytes(self.heap)))
+
+    def write(self, path):
+        if not self.sections:
+            self.compile()
+
+        offset = _align(HEADER.size + SECTION.size * len(self.sections))
+        table = []
+        for name, values in self.sections:
+            table.append(SECTION.pack(name.encode('ascii'), values.typecode.encode('ascii'), offset, len(values)))
+            offset = _align(offset + len(values) * values.itemsize)
+
+        with open(path, 'wb') as output:
+            output.write(HEADER.pack(MAGIC, sys.byteorder.encode('ascii'), len(self.sections)))
+            output.write(b''.join(table))
+            for name, values in self.sections:
+                output.write(b'\0' * (_align(output.tell()) - output.tell()))
+                values.tofile(output)
+
+
+class Snapshot(object):
+    """
+    Read only view of a compiled snapshot. The file is memory mapped, so opening it costs no parsing
+    and its pages are shared by all processes through the OS page cache.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as snapshot_file:
+            self.mmap = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, byteorder, section_count = HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC:
+            raise ValueError("%s is not a SNOMED CT snapshot file." % path)
+        if byteorder.rstrip(b'\0').decode('ascii') != sys.byteorder:
+            raise ValueError("Snapshot %s was compiled on a machine with different byte order." % path)
+
+        self.view = view = memoryview(self.mmap)
+        self.sections = {}
+        for i in range(section_count):
+            name, typecode, offset, length = SECTION.unpack_from(self.mmap, HEADER.size + i * SECTION.size)
+            itemsize = array(typecode.decode('ascii')).itemsize
+            self.sections[name.rstrip(b'\0').decode('ascii')] = view[offset:offset + length * itemsize].cast(
+                typecode.decode('ascii'))
+
+        self.concepts = self.sections['concepts']
+        self.flags = self.sections['flags']
+        self.heap = self.sections['heap']
+
+    def close(self):
+        self.concepts = self.flags = self.heap = None
+        for section in self.sections.values():
+            section.release()
+        self.sections = {}
+        self.view.release()
+        self.mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.concepts)
+
+    def __contains__(self, concept_id):
+        return self.index(concept_id) is not None
+
+    def index(self, concept_id):
+        i = bisect_left(self.concepts, concept_id)
+        return i if i < len(self.concepts) and self.concepts[i] == concept_id else None
+
+    def is_active(self, concept_id):
+        i = self.index(concept_id)
+        return i is not None and bool(self.flags[i] & ACTIVE)
+
+    def is_defined(self, concept_id):
+        i = self.index(concept_id)
+        return i is not None and bool(self.flags[i] & DEFINED)
+
+    def __term(self, section, concept_id):
+        i = self.index(concept_id)
+        if i is None or section not in self.sections:
+            return None
+        offset, length = self.sections[section][2 * i], self.sections[section][2 * i + 1]
+        return self.heap[offset:offset + length].tobytes().decode('utf-8') if length else None
+
+    def get_preferred_term(self, concept_id, lang='en_us'):
+        return self.__term('pt.%s' % lang, concept_id)
+
+    def get_fully_specified_name(self, concept_id, lang='en_us'):
+        return self.__term('fsn.%s' % lang, concept_id)
+
+    def __related(self, name, concept_id):
+        i = self.index(concept_id)
+        if i is None:
+            return []
+        offsets, targets = self.sections['%s.offsets' % name], self.sections[name]
+        return [self.concepts[j] for j in targets[offsets[i]:offsets[i + 1]]]
+
+    def get_parents(self, concept_id):
+        return self.__related('parents', concept_id)
+
+    def get_children(self, concept_id):
+        return self.__related('children', concept_id)
+
+    def get_ancestors(self, concept_id):
+        ancestors, stack = set(), self.get_parents(concept_id)
+        while stack:
+            ancestor_id = stack.pop()
+            if ancestor_id not in ancestors:
+                ancestors.add(ancestor_id)
+                stack.extend(self.get_parents(ancestor_id))
+        return ancestors
+
+    def is_subsumed_by(self, concept_id, ancestor_id):
+        return concept_id == ancestor_id or ancestor_id in self.get_ancestors(concept_id)
+
+    def is_refset_member(self, refset_id, concept_id):
+        members, i = self.sections.get('refset.%d' % refset_id), self.index(concept_id)
+        if members is None or i is None:
+            return False
+        j = bisect_left(members, i)
+        return j < len(members) and members[j] == i
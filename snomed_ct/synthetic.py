@@ -0,0 +1,275 @@
+from __future__ import unicode_literals
+import csv
+import io
+import os
+import random
+import uuid
+
+from .hierarchy import ROOT_CONCEPT_ID
+from .models import AssociationRefSet, Concept, Description, LangRefSet, Relationship
+from .rf2 import RF2_FILES, get_file_path, get_header
+from .utils import calculate_verhoeff
+
+# Number of concepts (active and inactive) of the International Edition
+INTERNATIONAL_CONCEPTS = 480000
+
+CORE_MODULE = 900000000000207008
+MODEL_COMPONENT = 900000000000441003
+STATED_RELATIONSHIP = 900000000000010007
+EXISTENTIAL_RESTRICTION = 900000000000451002
+DEFINITION = 900000000000550004
+ENTIRE_TERM_CASE_INSENSITIVE = 900000000000448009
+INACTIVATION_INDICATOR = 900000000000489007
+INACTIVATION_REASONS = (900000000000482003, 900000000000483008, 900000000000487009)
+SIMPLE_MAP = 900000000000497000
+COMPLEX_MAP = 447562003
+MAP_CORRELATION = 447561005
+MAP_CATEGORY = 447637006
+
+METADATA_CONCEPTS = (
+    (ROOT_CONCEPT_ID, 'SNOMED CT Concept', 'SNOMED RT+CTV3'),
+    (MODEL_COMPONENT, 'SNOMED CT Model Component', 'metadata'),
+    (CORE_MODULE, 'SNOMED CT core module', 'core metadata concept'),
+    (Concept.DEFINITION_STATUS_CHOICES.primitive, 'Not sufficiently defined by necessary conditions',
+     'core metadata concept'),
+    (Concept.DEFINITION_STATUS_CHOICES.defined, 'Sufficiently defined by necessary conditions',
+     'core metadata concept'),
+    (Description.TYPE_CHOICES.fully_specified_name, 'Fully specified name', 'core metadata concept'),
+    (Description.TYPE_CHOICES.synonym, 'Synonym', 'core metadata concept'),
+    (DEFINITION, 'Definition', 'core metadata concept'),
+    (Description.CASE_SIGNIFICANCE_CHOICES.initial_char_case_insensitive,
+     'Only initial character case insensitive', 'core metadata concept'),
+    (Description.CASE_SIGNIFICANCE_CHOICES.case_sensitive, 'Entire term case sensitive', 'core metadata concept'),
+    (ENTIRE_TERM_CASE_INSENSITIVE, 'Entire term case insensitive', 'core metadata concept'),
+    (Relationship.CHARACTERISTIC_TYPE_CHOICES.inferred, 'Inferred relationship', 'core metadata concept'),
+    (Relationship.CHARACTERISTIC_TYPE_CHOICES.additional, 'Additional relationship', 'core metadata concept'),
+    (STATED_RELATIONSHIP, 'Stated relationship', 'core metadata concept'),
+    (EXISTENTIAL_RESTRICTION, 'Existential restriction modifier', 'core metadata concept'),
+    (LangRefSet.REFSET_CHOICES.en_us, 'United States of America English language reference set',
+     'foundation metadata concept'),
+    (LangRefSet.REFSET_CHOICES.en_gb, 'Great Britain English language reference set', 'foundation metadata concept'),
+    (LangRefSet.ACCEPTABILITY_CHOICES.preferred, 'Preferred', 'foundation metadata concept'),
+    (LangRefSet.ACCEPTABILITY_CHOICES.acceptable, 'Acceptable', 'foundation metadata concept'),
+    (AssociationRefSet.REFSET_CHOICES.same_as, 'SAME AS association reference set', 'foundation metadata concept'),
+    (AssociationRefSet.REFSET_CHOICES.replaced_by, 'REPLACED BY association reference set',
+     'foundation metadata concept'),
+    (AssociationRefSet.REFSET_CHOICES.possibly_equivalent_to, 'POSSIBLY EQUIVALENT TO association reference set',
+     'foundation metadata concept'),
+    (INACTIVATION_INDICATOR, 'Concept inactivation indicator reference set', 'foundation metadata concept'),
+    (INACTIVATION_REASONS[0], 'Duplicate component', 'foundation metadata concept'),
+    (INACTIVATION_REASONS[1], 'Outdated component', 'foundation metadata concept'),
+    (INACTIVATION_REASONS[2], 'Component moved elsewhere', 'foundation metadata concept'),
+    (SIMPLE_MAP, 'CTV3 simple map', 'foundation metadata concept'),
+    (COMPLEX_MAP, 'ICD-10 complex map reference set', 'foundation metadata concept'),
+    (MAP_CORRELATION, 'SNOMED CT source code to target map code correlation not specified',
+     'foundation metadata concept'),
+    (MAP_CATEGORY, 'Map source concept is properly classified', 'foundation metadata concept'),
+    (Relationship.TYPE_CHOICES.is_a, 'Is a', 'attribute'),
+    (Relationship.TYPE_CHOICES.finding_site, 'Finding site', 'attribute'),
+    (Relationship.TYPE_CHOICES.associated_morphology, 'Associated morphology', 'attribute'),
+    (Relationship.TYPE_CHOICES.causative_agent, 'Causative agent', 'attribute'),
+    (Relationship.TYPE_CHOICES.method, 'Method', 'attribute'),
+    (Relationship.TYPE_CHOICES.procedure_site_direct, 'Procedure site direct', 'attribute'),
+)
+
+# (SCTID, name, semantic tags of descendants, share of synthetic concepts)
+TOP_LEVEL_CONCEPTS = (
+    (404684003, 'Clinical finding', ('disorder', 'finding'), 35),
+    (71388002, 'Procedure', ('procedure', 'regime/therapy'), 17),
+    (123037004, 'Body structure', ('body structure', 'morphologic abnormality'), 10),
+    (410607006, 'Organism', ('organism',), 10),
+    (105590001, 'Substance', ('substance',), 7),
+    (373873005, 'Pharmaceutical / biologic product', ('product', 'medicinal product'), 6),
+    (363787002, 'Observable entity', ('observable entity',), 3),
+    (362981000, 'Qualifier value', ('qualifier value',), 3),
+    (260787004, 'Physical object', ('physical object',), 2),
+    (243796009, 'Situation with explicit context', ('situation',), 2),
+    (123038009, 'Specimen', ('specimen',), 1),
+    (272379006, 'Event', ('event',), 1),
+    (308916002, 'Environment or geographical location', ('environment', 'geographic location'), 1),
+    (48176007, 'Social context', ('social concept', 'person'), 1),
+    (254291000, 'Staging and scales', ('staging scale', 'assessment scale'), 1),
+    (419891008, 'Record artifact', ('record artifact',), 1),
+    (78621006, 'Physical force', ('physical force',), 1),
+    (370115009, 'Special concept', ('special concept',), 1),
+)
+
+SYLLABLES = ('ab', 'ac', 'ad', 'al', 'an', 'ar', 'ba', 'bro', 'ca', 'car', 'chi', 'co', 'cy', 'de', 'der', 'di',
+             'do', 'en', 'er', 'fi', 'ga', 'gen', 'gi', 'he', 'hy', 'id', 'in', 'ic', 'la', 'le', 'li', 'lo', 'ma',
+             'me', 'mi', 'mo', 'my', 'na', 'ne', 'no', 'ol', 'on', 'or', 'os', 'pa', 'pe', 'pha', 'pi', 'po',
+             'pul', 'ra', 're', 'ri', 'ro', 'sa', 'se', 'si', 'so', 'ta', 'te', 'ti', 'to', 'tra', 'tu', 'ul',
+             'um', 'ur', 'va', 've', 'vi', 'xi', 'zo')
+
+
+class SyntheticRelease(object):
+    """
+    Generates structurally valid RF2 Snapshot release: Verhoeff valid SCTIDs, is-a DAG under top level
+    hierarchies, FSN / preferred term / synonyms with US and GB language refsets, attribute relationships,
+    inactive concepts with historical associations, simple refsets and maps.
+    Scale 1.0 roughly matches size of the International Edition.
+    """
+
+    def __init__(self, scale=0.01, release_date='20260131', seed=0, inactive_ratio=0.2):
+        self.random = random.Random(seed)
+        self.concept_count = max(int(INTERNATIONAL_CONCEPTS * scale), len(TOP_LEVEL_CONCEPTS))
+        self.release_date = release_date
+        self.inactive_ratio = inactive_ratio
+        self.counters = {}
+        self.words = sorted(set(
+            ''.join(self.random.choice(SYLLABLES) for _ in range(self.random.randint(2, 4)))
+            for _ in range(max(1000, self.concept_count // 20))))
+        self.refsets = [self.sctid('00') for _ in range(3)]
+
+    def sctid(self, partition):
+        # Core namespace identifiers, item numbers start above any short metadata SCTID
+        self.counters[partition] = self.counters.get(partition, 2000000) + 1
+        identifier = '%d%s' % (self.counters[partition], partition)
+        return int(identifier + str(calculate_verhoeff(identifier)))
+
+    def uuid(self):
+        return str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+
+    def term(self):
+        words = [self.random.choice(self.words) for _ in range(self.random.randint(1, 4))]
+        return ' '.join(words).capitalize()
+
+    def write(self, location):
+        files, writers = [], {}
+        try:
+            for rf2_file in RF2_FILES:
+                path = get_file_path(rf2_file, location, self.release_date)
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                output = io.open(path, 'w', encoding='utf-8', newline='')
+                files.append(output)
+                writers[rf2_file.table] = csv.writer(output, delimiter=str('\t'), lineterminator='\r\n',
+                                                     quoting=csv.QUOTE_NONE)
+                writers[rf2_file.table].writerow(get_header(rf2_file))
+            self.generate(writers)
+        finally:
+            for output in files:
+                output.close()
+
+    def row(self, writers, table, active, *values):
+        if table in ('sct2_concept', 'sct2_description', 'sct2_text_definition', 'sct2_relationship',
+                     'sct2_stated_relationship'):
+            identifier, values = values[0], values[1:]
+        else:
+            identifier = self.uuid()
+        writers[table].writerow((identifier, self.release_date, int(active), CORE_MODULE) + values)
+
+    def concept(self, writers, concept_id, name, tag, active=True, defined=False):
+        self.row(writers, 'sct2_concept', active, concept_id,
+                 Concept.DEFINITION_STATUS_CHOICES.defined if defined else Concept.DEFINITION_STATUS_CHOICES.primitive)
+
+        terms = [(Description.TYPE_CHOICES.fully_specified_name, '%s (%s)' % (name, tag), True),
+                 (Description.TYPE_CHOICES.synonym, name, True)]
+        terms.extend((Description.TYPE_CHOICES.synonym, self.term(), False)
+                     for _ in range(self.random.choice((0, 0, 1, 1, 2, 3))))
+
+        for type_id, term, preferred in terms:
+            description_id = self.sctid('01')
+            self.row(writers, 'sct2_description', True, description_id, concept_id, 'en', type_id, term,
+                     Description.CASE_SIGNIFICANCE_CHOICES.initial_char_case_insensitive)
+            for refset_id in (LangRefSet.REFSET_CHOICES.en_us, LangRefSet.REFSET_CHOICES.en_gb):
+                self.row(writers, 'sct2_lang_refset', True, refset_id, description_id,
+                         LangRefSet.ACCEPTABILITY_CHOICES.preferred if preferred else
+                         LangRefSet.ACCEPTABILITY_CHOICES.acceptable)
+
+    def relationship(self, writers, source_id, destination_id, type_id, group=0):
+        self.row(writers, 'sct2_relationship', True, self.sctid('02'), source_id, destination_id, group, type_id,
+                 Relationship.CHARACTERISTIC_TYPE_CHOICES.inferred, EXISTENTIAL_RESTRICTION)
+        self.row(writers, 'sct2_stated_relationship', True, self.sctid('02'), source_id, destination_id, group,
+                 type_id, STATED_RELATIONSHIP, EXISTENTIAL_RESTRICTION)
+
+    def generate(self, writers):
+        is_a = Relationship.TYPE_CHOICES.is_a
+
+        for concept_id, name, tag in METADATA_CONCEPTS:
+            self.concept(writers, concept_id, name, tag)
+            if concept_id not in (ROOT_CONCEPT_ID, MODEL_COMPONENT):
+                self.relationship(writers, concept_id, MODEL_COMPONENT, is_a)
+        self.relationship(writers, MODEL_COMPONENT, ROOT_CONCEPT_ID, is_a)
+
+        for refset_id in self.refsets:
+            self.concept(writers, refset_id, '%s reference set' % self.term(), 'foundation metadata concept')
+            self.relationship(writers, refset_id, MODEL_COMPONENT, is_a)
+
+        members = {}
+        for concept_id, name, tags, share in TOP_LEVEL_CONCEPTS:
+            self.concept(writers, concept_id, name, tags[0])
+            self.relationship(writers, concept_id, ROOT_CONCEPT_ID, is_a)
+            members[concept_id] = [concept_id]
+
+        top_levels = [top_level for top_level in TOP_LEVEL_CONCEPTS for _ in range(top_level[3])]
+        body_structures, active_concepts, inactive_concepts = members[123037004], [], []
+
+        for _ in range(self.concept_count):
+            top_level_id, _, tags, _ = self.random.choice(top_levels)
+            concept_id = self.sctid('00')
+            active = self.random.random() >= self.inactive_ratio
+            self.concept(writers, concept_id, self.term(), self.random.choice(tags), active,
+                         defined=active and self.random.random() < 0.3)
+
+            if not active:
+                self.inactivate(writers, concept_id, active_concepts, inactive_concepts)
+                continue
+
+            # Parents are always picked from earlier concepts of the same hierarchy, so the graph stays acyclic
+            hierarchy = members[top_level_id]
+            for parent_id in set(self.random.choice(hierarchy) for _ in range(self.random.choice((1, 1, 1, 2)))):
+                self.relationship(writers, concept_id, parent_id, is_a)
+            hierarchy.append(concept_id)
+            active_concepts.append(concept_id)
+
+            if top_level_id in (404684003, 71388002) and len(body_structures) > 1:
+                self.attributes(writers, concept_id, top_level_id, body_structures)
+            self.extras(writers, concept_id, top_level_id)
+
+    def attributes(self, writers, concept_id, top_level_id, body_structures):
+        if top_level_id == 404684003:
+            types = (Relationship.TYPE_CHOICES.finding_site, Relationship.TYPE_CHOICES.associated_morphology)
+        else:
+            types = (Relationship.TYPE_CHOICES.procedure_site_direct, Relationship.TYPE_CHOICES.method)
+
+        for group in range(self.random.randint(0, 2)):
+            for type_id in types:
+                self.relationship(writers, concept_id, self.random.choice(body_structures), type_id, group + 1)
+
+    def inactivate(self, writers, concept_id, active_concepts, inactive_concepts):
+        self.row(writers, 'sct2_attribute_value_refset', True, INACTIVATION_INDICATOR, concept_id,
+                 self.random.choice(INACTIVATION_REASONS))
+
+        # Some inactive concepts point to another inactive one, so historical chains have to be followed
+        if inactive_concepts and self.random.random() < 0.1:
+            targets = [self.random.choice(inactive_concepts)]
+        elif active_concepts:
+            targets = [self.random.choice(active_concepts) for _ in range(self.random.choice((1, 1, 1, 2)))]
+        else:
+            targets = []
+
+        refset_id = AssociationRefSet.REFSET_CHOICES.replaced_by if len(targets) == 1 else \
+            AssociationRefSet.REFSET_CHOICES.possibly_equivalent_to
+        for target_id in set(targets):
+            self.row(writers, 'sct2_association_refset', True, refset_id, concept_id, target_id)
+        inactive_concepts.append(concept_id)
+
+    def extras(self, writers, concept_id, top_level_id):
+        if self.random.random() < 0.03:
+            self.row(writers, 'sct2_text_definition', True, self.sctid('01'), concept_id, 'en', DEFINITION,
+                     '%s.' % ' '.join(self.term() for _ in range(3)), ENTIRE_TERM_CASE_INSENSITIVE)
+
+        if self.random.random() < 0.05:
+            self.row(writers, 'sct2_simple_refset', True, self.random.choice(self.refsets), concept_id)
+
+        if self.random.random() < 0.1:
+            self.row(writers, 'sct2_simple_map_refset', True, SIMPLE_MAP, concept_id,
+                     'X%04d' % self.random.randint(0, 9999))
+
+        if top_level_id == 404684003 and self.random.random() < 0.3:
+            target = '%s%02d.%d' % (self.random.choice('ABCDEFGHIJKLMN'), self.random.randint(0, 99),
+                                    self.random.randint(0, 9))
+            self.row(writers, 'sct2_complex_map_refset', True, COMPLEX_MAP, concept_id, 1, 1, 'TRUE',
+                     'ALWAYS %s' % target, target, MAP_CORRELATION)
+            self.row(writers, 'sct2_extended_map_refset', True, COMPLEX_MAP, concept_id, 1, 1, 'TRUE',
+                     'ALWAYS %s' % target, target, MAP_CORRELATION, MAP_CATEGORY)
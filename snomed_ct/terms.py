@@ -0,0 +1,24 @@
+from __future__ import unicode_literals
+
+from .metrics import instrumented
+from .models import Concept
+from .utils import chunked
+
+
+def _get_terms(concept_ids, lang, fully_specified_name, chunk_size):
+    field = 'fully_specified_name' if fully_specified_name else 'preferred_term'
+    terms = {}
+    for chunk in chunked(concept_ids, chunk_size):
+        terms.update(Concept.objects.filter(id__in=chunk).with_terms(
+            lang, fully_specified_name=fully_specified_name).values_list('id', field))
+    return terms
+
+
+@instrumented('terms.get_preferred_terms')
+def get_preferred_terms(concept_ids, lang='en_us', chunk_size=10000):
+    return _get_terms(concept_ids, lang, False, chunk_size)
+
+
+@instrumented('terms.get_fully_specified_names')
+def get_fully_specified_names(concept_ids, lang='en_us', chunk_size=10000):
+    return _get_terms(concept_ids, lang, True, chunk_size)
@@ -0,0 +1,17 @@
+from __future__ import unicode_literals
+
+from django.conf.urls import url
+
+from . import views
+
+# FHIR terminology operations, e.g. url(r'^fhir/', include('snomed_ct.urls'))
+urlpatterns = [
+    url(r'^$', views.batch, name='snomed_ct_fhir_batch'),
+    url(r'^CodeSystem/\$lookup$', views.lookup, name='snomed_ct_fhir_lookup'),
+    url(r'^CodeSystem/\$subsumes$', views.subsumes, name='snomed_ct_fhir_subsumes'),
+    url(r'^CodeSystem/\$validate-code$', views.code_system_validate_code,
+        name='snomed_ct_fhir_code_system_validate_code'),
+    url(r'^ValueSet/\$validate-code$', views.value_set_validate_code,
+        name='snomed_ct_fhir_value_set_validate_code'),
+    url(r'^ValueSet/\$expand$', views.expand, name='snomed_ct_fhir_expand'),
+]
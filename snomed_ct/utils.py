@@ -0,0 +1,125 @@
+from __future__ import unicode_literals
+
+import re
+import unicodedata
+from itertools import islice
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class CopyStream(object):
+    """
+    File-like wrapper around an iterator of lines, so COPY FROM STDIN can consume it without
+    building the whole payload in memory. Lines are either all text or all bytes, given by empty.
+    """
+
+    def __init__(self, lines, empty=''):
+        self.lines = iter(lines)
+        self.empty = empty
+        self.newline = b'\n' if isinstance(empty, bytes) else '\n'
+        self.buffer = empty
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            try:
+                self.buffer += next(self.lines)
+            except StopIteration:
+                break
+        if size < 0:
+            data, self.buffer = self.buffer, self.empty
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def readline(self, size=-1):
+        if not self.buffer:
+            self.buffer = next(self.lines, self.empty)
+        line, newline, self.buffer = self.buffer.partition(self.newline)
+        return line + newline
+
+
+def stream_query(sql, params=None, using=DEFAULT_DB_ALIAS, chunk_size=2000):
+    # Server side cursor, so large result sets never have to be held in memory at once
+    with connections[using].chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            for row in rows:
+                yield row
+
+
+# Verhoeff algorithm tables, the same as used by checksumVerhoeff() database function
+VERHOEFF_D = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9),
+    (1, 2, 3, 4, 0, 6, 7, 8, 9, 5),
+    (2, 3, 4, 0, 1, 7, 8, 9, 5, 6),
+    (3, 4, 0, 1, 2, 8, 9, 5, 6, 7),
+    (4, 0, 1, 2, 3, 9, 5, 6, 7, 8),
+    (5, 9, 8, 7, 6, 0, 4, 3, 2, 1),
+    (6, 5, 9, 8, 7, 1, 0, 4, 3, 2),
+    (7, 6, 5, 9, 8, 2, 1, 0, 4, 3),
+    (8, 7, 6, 5, 9, 3, 2, 1, 0, 4),
+    (9, 8, 7, 6, 5, 4, 3, 2, 1, 0),
+)
+VERHOEFF_P = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9),
+    (1, 5, 7, 6, 2, 8, 3, 0, 9, 4),
+    (5, 8, 0, 3, 7, 9, 6, 1, 4, 2),
+    (8, 9, 1, 6, 0, 4, 3, 5, 2, 7),
+    (9, 4, 5, 3, 1, 2, 6, 8, 7, 0),
+    (4, 2, 8, 6, 5, 7, 3, 9, 0, 1),
+    (2, 7, 9, 3, 8, 0, 6, 4, 1, 5),
+    (7, 0, 4, 6, 9, 1, 3, 2, 5, 8),
+)
+VERHOEFF_INV = (0, 4, 3, 2, 1, 5, 6, 7, 8, 9)
+
+CONCEPT_PARTITIONS = ('00', '10')
+DESCRIPTION_PARTITIONS = ('01', '11')
+RELATIONSHIP_PARTITIONS = ('02', '12')
+
+
+def verify_verhoeff(number):
+    checksum = 0
+    for i, digit in enumerate(reversed(str(number))):
+        checksum = VERHOEFF_D[checksum][VERHOEFF_P[i % 8][int(digit)]]
+    return checksum == 0
+
+
+def calculate_verhoeff(number):
+    checksum = 0
+    for i, digit in enumerate(reversed(str(number))):
+        checksum = VERHOEFF_D[checksum][VERHOEFF_P[(i + 1) % 8][int(digit)]]
+    return VERHOEFF_INV[checksum]
+
+
+def is_valid_sctid(value, partitions=CONCEPT_PARTITIONS):
+    value = str(value).strip()
+    # SCTID has between 6 and 18 digits, no leading zero, a partition identifier and a check digit
+    if not value.isdigit() or not 6 <= len(value) <= 18 or value[0] == '0':
+        return False
+    if partitions and value[-3:-1] not in partitions:
+        return False
+    return verify_verhoeff(value)
+
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalise_term(term):
+    # Python counterpart of lower(unaccent(term))
+    return ''.join(c for c in unicodedata.normalize('NFKD', term) if not unicodedata.combining(c)).lower()
+
+
+def tokenise(term):
+    return TOKEN_RE.findall(normalise_term(term))
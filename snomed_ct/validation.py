@@ -0,0 +1,79 @@
+from __future__ import unicode_literals
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections, router
+
+from .models import Concept
+from .utils import CONCEPT_PARTITIONS, DESCRIPTION_PARTITIONS, RELATIONSHIP_PARTITIONS
+
+Check = namedtuple('Check', ('name', 'table', 'condition'))
+ValidationResult = namedtuple('ValidationResult', ('name', 'table', 'count', 'samples'))
+
+
+def _references(table, column, *targets):
+    # Anti-join, row is a violation when the column matches none of the target tables
+    return Check('%s.%s' % (table, column), table, ' AND '.join(
+        'NOT EXISTS (SELECT 1 FROM %s x WHERE x.id = t.%s)' % (target, column) for target in targets))
+
+
+def _sctids(table, partitions):
+    return Check('%s.id check digit' % table, table, "NOT verifyVerhoeff(t.id) OR t.id :: TEXT !~ '(%s)[0-9]$'" %
+                 '|'.join(partitions))
+
+
+CHECKS = (
+    _references('sct2_concept', 'definition_status_id', 'sct2_concept'),
+    _references('sct2_description', 'concept_id', 'sct2_concept'),
+    _references('sct2_description', 'type_id', 'sct2_concept'),
+    _references('sct2_text_definition', 'concept_id', 'sct2_concept'),
+    _references('sct2_relationship', 'source_id', 'sct2_concept'),
+    _references('sct2_relationship', 'destination_id', 'sct2_concept'),
+    _references('sct2_relationship', 'type_id', 'sct2_concept'),
+    _references('sct2_stated_relationship', 'source_id', 'sct2_concept'),
+    _references('sct2_stated_relationship', 'destination_id', 'sct2_concept'),
+    _references('sct2_stated_relationship', 'type_id', 'sct2_concept'),
+    _references('sct2_lang_refset', 'refset_id', 'sct2_concept'),
+    _references('sct2_lang_refset', 'referenced_component_id', 'sct2_description', 'sct2_text_definition'),
+    _references('sct2_association_refset', 'referenced_component_id', 'sct2_concept', 'sct2_description'),
+    _references('sct2_association_refset', 'target_component_id', 'sct2_concept', 'sct2_description'),
+    _references('sct2_simple_refset', 'refset_id', 'sct2_concept'),
+    _references('sct2_simple_refset', 'referenced_component_id', 'sct2_concept', 'sct2_description'),
+    _references('sct2_attribute_value_refset', 'referenced_component_id', 'sct2_concept', 'sct2_description'),
+    _references('sct2_attribute_value_refset', 'value_id', 'sct2_concept'),
+    _references('sct2_simple_map_refset', 'referenced_component_id', 'sct2_concept'),
+    _references('sct2_complex_map_refset', 'referenced_component_id', 'sct2_concept'),
+    _references('sct2_extended_map_refset', 'referenced_component_id', 'sct2_concept'),
+    _sctids('sct2_concept', CONCEPT_PARTITIONS),
+    _sctids('sct2_description', DESCRIPTION_PARTITIONS),
+    _sctids('sct2_text_definition', DESCRIPTION_PARTITIONS),
+    _sctids('sct2_relationship', RELATIONSHIP_PARTITIONS),
+    _sctids('sct2_stated_relationship', RELATIONSHIP_PARTITIONS),
+)
+
+
+def run_check(check, using, samples=5):
+    try:
+        with connections[using].cursor() as cursor:
+            cursor.execute("""
+                WITH violation AS (
+                  SELECT t.id FROM %s t WHERE %s
+                )
+                SELECT count(*), (SELECT array_agg(s.id :: TEXT) FROM (SELECT id FROM violation LIMIT %%s) s)
+                FROM violation;
+            """ % (check.table, check.condition), [samples])
+            count, sample_ids = cursor.fetchone()
+        return ValidationResult(check.name, check.table, count, sample_ids or [])
+    finally:
+        # Checks run in worker threads, each of them has its own connection
+        connections[using].close()
+
+
+def validate_release(using=None, workers=4, samples=5, checks=CHECKS):
+    """
+    Runs referential integrity and SCTID check digit checks of loaded release, workers of them at a time in
+    separate connections, so they only see committed data. Returns ValidationResult of every check in order.
+    """
+    using = using or router.db_for_read(Concept)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda check: run_check(check, using, samples), checks))
@@ -0,0 +1,436 @@
+from __future__ import unicode_literals
+import calendar
+import json
+from datetime import datetime
+from functools import wraps
+
+from django.conf import settings
+from django.db import router
+from django.http import HttpResponse, JsonResponse, QueryDict
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from . import hierarchy, terms
+from .metrics import instrumented
+from .models import Concept, Description, LangRefSet
+from .release import get_release_version
+from .utils import is_valid_sctid, stream_query
+
+SNOMED_CT_SYSTEM = 'http://snomed.info/sct'
+SNOMED_CT_INTERNATIONAL_EDITION = 900000000000207008
+
+PREFERRED_TERM_SQL = """
+    SELECT d.term
+    FROM sct2_description d
+      JOIN sct2_lang_refset l ON l.referenced_component_id = d.id
+    WHERE d.concept_id = %%s AND d.active = TRUE AND d.type_id = %d AND
+          l.active = TRUE AND l.refset_id = %%s AND l.acceptability_id = %d
+    LIMIT 1
+""" % (Description.TYPE_CHOICES.synonym, LangRefSet.ACCEPTABILITY_CHOICES.preferred)
+
+
+class FHIRError(Exception):
+    def __init__(self, message, status=400, code='invalid'):
+        super(FHIRError, self).__init__(message)
+        self.status = status
+        self.code = code
+
+
+def operation_outcome(message, code='invalid'):
+    return {
+        'resourceType': 'OperationOutcome',
+        'issue': [{'severity': 'error', 'code': code, 'diagnostics': message}],
+    }
+
+
+def get_version_uri():
+    return '%s/%d/version/%s' % (SNOMED_CT_SYSTEM, SNOMED_CT_INTERNATIONAL_EDITION, get_release_version())
+
+
+def fhir_operation(view):
+    """
+    Renders FHIR resources returned by the view as JSON. GET responses are cached by clients and proxies
+    until the next release load, as the ETag is the release version.
+    """
+
+    instrumented_view = instrumented('fhir.%s' % view.__name__)(view)
+
+    @csrf_exempt
+    @require_http_methods(['GET', 'HEAD', 'POST'])
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        version = get_release_version()
+        etag = '"%s"' % version
+        # Without a loaded release there is no version to validate cached responses against
+        cacheable = request.method in ('GET', 'HEAD') and bool(version)
+
+        if cacheable and etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            response = HttpResponse(status=304)
+        else:
+            try:
+                resource = instrumented_view(request, get_parameters(request), *args, **kwargs)
+            except FHIRError as e:
+                return JsonResponse(operation_outcome(str(e), e.code), status=e.status,
+                                    content_type='application/fhir+json')
+            response = JsonResponse(resource, content_type='application/fhir+json')
+
+        if cacheable:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(calendar.timegm(datetime.strptime(version, '%Y%m%d').timetuple()))
+            response['Cache-Control'] = 'public, max-age=%d' % getattr(settings, 'SNOMED_CT_FHIR_MAX_AGE', 86400)
+        return response
+
+    return wrapper
+
+
+def get_parameters(request):
+    if request.method != 'POST' or not request.body:
+        return request.GET.dict()
+
+    try:
+        resource = json.loads(request.body.decode('utf-8'))
+    except ValueError:
+        raise FHIRError("Request body is not valid JSON.")
+
+    if not isinstance(resource, dict):
+        raise FHIRError("Request body is not a FHIR resource.")
+    if resource.get('resourceType') != 'Parameters':
+        return resource
+    return parse_parameters(resource)
+
+
+def parse_parameters(resource):
+    """
+    Flattens Parameters resource into a dict of parameter values, codings are reduced to their code.
+    """
+    parameters = {}
+    entries = resource.get('parameter', [])
+    if not isinstance(entries, list):
+        raise FHIRError("Parameters parameter has to be a list.")
+    for parameter in entries:
+        if not isinstance(parameter, dict) or 'name' not in parameter:
+            raise FHIRError("Every parameter of Parameters has to be an object with a name.")
+        for key, value in parameter.items():
+            if key == 'valueCoding' and not isinstance(value, dict):
+                raise FHIRError("Parameter %s valueCoding has to be an object." % parameter['name'])
+            if key == 'valueCoding' and parameter['name'] == 'coding':
+                parameters.setdefault('system', value.get('system'))
+                parameters['code'] = value.get('code')
+            elif key == 'valueCoding':
+                parameters[parameter['name']] = value.get('code')
+            elif key.startswith('value'):
+                parameters[parameter['name']] = value
+    return parameters
+
+
+def get_lang(parameters):
+    lang = (parameters.get('displayLanguage') or 'en-US').lower().replace('-', '_')
+    return lang if hasattr(LangRefSet.REFSET_CHOICES, lang) else 'en_us'
+
+
+def get_code(parameters, name='code', required=True, system='system'):
+    if parameters.get(system) not in (None, SNOMED_CT_SYSTEM):
+        raise FHIRError("Only %s code system is supported." % SNOMED_CT_SYSTEM, code='not-supported')
+
+    code = parameters.get(name)
+    if code is None and required:
+        raise FHIRError("Missing required parameter %s." % name, code='required')
+    return code
+
+
+def get_concept_id(parameters, name='code', required=True):
+    code = get_code(parameters, name, required)
+    if code is None:
+        return None
+    if not is_valid_sctid(code):
+        raise FHIRError("Code %s is not a valid SNOMED CT concept identifier." % code, code='code-invalid')
+    return int(code)
+
+
+def value_set_source(url):
+    """
+    Returns SQL (and params) selecting concept ids of implicit SNOMED CT value set with given url.
+    """
+    if url is None or url == '%s?fhir_vs' % SNOMED_CT_SYSTEM:
+        return """SELECT c.id FROM sct2_concept c WHERE c.active = TRUE""", []
+
+    prefix, _, definition = url.partition('?fhir_vs=')
+    if prefix != SNOMED_CT_SYSTEM and not prefix.startswith(SNOMED_CT_SYSTEM + '/'):
+        raise FHIRError("Only implicit SNOMED CT value sets are supported.", code='not-supported')
+
+    kind, _, concept_id = definition.partition('/')
+    if not is_valid_sctid(concept_id):
+        raise FHIRError("Invalid value set url %s." % url)
+
+    if kind == 'isa':
+        return """
+            WITH RECURSIVE descendant(id) AS (
+                SELECT %%s :: BIGINT
+                UNION
+                SELECT r.source_id
+                FROM descendant d
+                  JOIN sct2_relationship r ON r.destination_id = d.id AND %s
+            )
+            SELECT id FROM descendant
+        """ % hierarchy.IS_A_CONDITION, [int(concept_id)]
+    if kind == 'refset':
+        return """
+            SELECT r.referenced_component_id AS id
+            FROM sct2_simple_refset r
+            WHERE r.active = TRUE AND r.refset_id = %s
+        """, [int(concept_id)]
+
+    raise FHIRError("Unsupported value set definition %s." % definition, code='not-supported')
+
+
+def validate_codes(entries, lang):
+    """
+    Validates (code, value set url) pairs with a set based query per distinct value set.
+    Returns list of (result, display, message) in the order of entries.
+    """
+    concept_ids = set(int(code) for code, url in entries if is_valid_sctid(code))
+    active = dict(Concept.objects.filter(id__in=concept_ids).records('id', 'active'))
+    displays = terms.get_preferred_terms([concept_id for concept_id in active if active[concept_id]], lang)
+
+    members = {}
+    using = router.db_for_read(Concept)
+    for url in set(url for code, url in entries if url):
+        try:
+            sql, params = value_set_source(url)
+        except FHIRError as e:
+            # Only entries of the unsupported value set fail, the error is reported as their message
+            members[url] = e
+            continue
+        members[url] = set(row[0] for row in stream_query(
+            """SELECT v.id FROM (%s) v WHERE v.id = ANY (%%s :: BIGINT [])""" % sql,
+            params + [list(concept_ids)], using=using))
+
+    results = []
+    for code, url in entries:
+        concept_id = int(code) if is_valid_sctid(code) else None
+        if concept_id is None:
+            results.append((False, None, "Code %s is not a valid SNOMED CT concept identifier." % code))
+        elif concept_id not in active:
+            results.append((False, None, "Unknown code %s." % code))
+        elif not active[concept_id]:
+            results.append((False, None, "Code %s is inactive." % code))
+        elif url and isinstance(members[url], FHIRError):
+            results.append((False, displays.get(concept_id), str(members[url])))
+        elif url and concept_id not in members[url]:
+            results.append((False, displays.get(concept_id), "Code %s is not in value set %s." % (code, url)))
+        else:
+            results.append((True, displays.get(concept_id), None))
+    return results
+
+
+def get_validation(parameters, value_set):
+    """
+    Returns (code, value set url) of $validate-code request. For CodeSystem operation url is the code system
+    canonical, only value set operation validates membership of the value set given by url.
+    """
+    if value_set:
+        return get_code(parameters), parameters.get('url')
+    get_code(parameters, system='url', required=False)
+    return get_code(parameters), None
+
+
+def validate_code_parameters(result, display, message):
+    parameters = [{'name': 'result', 'valueBoolean': result}]
+    if display:
+        parameters.append({'name': 'display', 'valueString': display})
+    if message:
+        parameters.append({'name': 'message', 'valueString': message})
+    return {'resourceType': 'Parameters', 'parameter': parameters}
+
+
+@fhir_operation
+def lookup(request, parameters):
+    concept_id = get_concept_id(parameters)
+    lang = get_lang(parameters)
+
+    concept = Concept.objects.filter(pk=concept_id).records('id', 'active')
+    concept = next(concept, None)
+    if concept is None:
+        raise FHIRError("Unknown code %d." % concept_id, status=404, code='not-found')
+
+    parameter = [
+        {'name': 'name', 'valueString': 'SNOMED CT'},
+        {'name': 'version', 'valueString': get_version_uri()},
+        {'name': 'display', 'valueString': terms.get_preferred_terms([concept_id], lang).get(concept_id)},
+        {'name': 'property', 'part': [
+            {'name': 'code', 'valueCode': 'inactive'}, {'name': 'value', 'valueBoolean': not concept.active}]},
+    ]
+    for name, related in (('parent', hierarchy.get_parents), ('child', hierarchy.get_children)):
+        for related_id in sorted(related([concept_id]).get(concept_id, ())):
+            parameter.append({'name': 'property', 'part': [
+                {'name': 'code', 'valueCode': name}, {'name': 'value', 'valueCode': str(related_id)}]})
+
+    descriptions = Description.objects.filter(concept_id=concept_id, active=True).records(
+        'language_code', 'type_id', 'term')
+    for description in descriptions:
+        parameter.append({'name': 'designation', 'part': [
+            {'name': 'language', 'valueCode': description.language_code},
+            {'name': 'use', 'valueCoding': {
+                'system': SNOMED_CT_SYSTEM, 'code': str(description.type_id),
+                'display': Description.TYPE_CHOICES[description.type_id]}},
+            {'name': 'value', 'valueString': description.term},
+        ]})
+
+    return {'resourceType': 'Parameters', 'parameter': parameter}
+
+
+@fhir_operation
+def subsumes(request, parameters):
+    concept_a = get_concept_id(parameters, 'codeA')
+    concept_b = get_concept_id(parameters, 'codeB')
+    ancestors = hierarchy.get_ancestors([concept_a, concept_b])
+
+    if concept_a == concept_b:
+        outcome = 'equivalent'
+    elif concept_a in ancestors.get(concept_b, ()):
+        outcome = 'subsumes'
+    elif concept_b in ancestors.get(concept_a, ()):
+        outcome = 'subsumed-by'
+    else:
+        outcome = 'not-subsumed'
+
+    return {'resourceType': 'Parameters', 'parameter': [{'name': 'outcome', 'valueCode': outcome}]}
+
+
+def validate_code(parameters, value_set):
+    # Malformed codes are not an error of the request, they are reported by result false
+    return validate_code_parameters(*validate_codes([get_validation(parameters, value_set)],
+                                                    get_lang(parameters))[0])
+
+
+@fhir_operation
+def code_system_validate_code(request, parameters):
+    return validate_code(parameters, value_set=False)
+
+
+@fhir_operation
+def value_set_validate_code(request, parameters):
+    return validate_code(parameters, value_set=True)
+
+
+@fhir_operation
+def expand(request, parameters):
+    url = parameters.get('url')
+    lang = get_lang(parameters)
+    text_filter = parameters.get('filter') or None
+    try:
+        offset = max(int(parameters.get('offset', 0)), 0)
+        count = min(max(int(parameters.get('count', 100)), 0), getattr(settings, 'SNOMED_CT_FHIR_MAX_COUNT', 1000))
+    except ValueError:
+        raise FHIRError("Parameters offset and count have to be integers.")
+
+    sql, params = value_set_source(url)
+    members_sql = """
+        FROM (%s) v
+          JOIN sct2_concept c ON c.id = v.id AND c.active = TRUE
+        WHERE %%s :: TEXT IS NULL OR EXISTS(
+            SELECT 1 FROM terms_based_view t
+            WHERE t.concept_id = v.id AND t.search_term @@ plainto_tsquery('simple', unaccent(%%s)))
+    """ % sql
+    members_params = params + [text_filter, text_filter]
+    using = router.db_for_read(Concept)
+
+    rows = list(stream_query("""
+        SELECT p.id, (%s), p.total
+        FROM (
+          SELECT v.id, count(*) OVER () AS total
+          %s
+          ORDER BY v.id
+          OFFSET %%s LIMIT %%s
+        ) p
+        ORDER BY p.id;
+    """ % (PREFERRED_TERM_SQL.replace('%s', 'p.id', 1), members_sql),
+        [getattr(LangRefSet.REFSET_CHOICES, lang)] + members_params + [offset, count], using=using))
+
+    if rows:
+        total = rows[0][2]
+    elif offset or not count:
+        # Window count is not available for an empty page, clients paging by total still need it
+        total = list(stream_query("""SELECT count(*) %s;""" % members_sql, members_params, using=using))[0][0]
+    else:
+        total = 0
+
+    return {
+        'resourceType': 'ValueSet',
+        'url': url or '%s?fhir_vs' % SNOMED_CT_SYSTEM,
+        'status': 'active',
+        'expansion': {
+            'timestamp': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'total': total,
+            'offset': offset,
+            'parameter': [{'name': 'version', 'valueUri': get_version_uri()}],
+            'contains': [{'system': SNOMED_CT_SYSTEM, 'code': str(concept_id), 'display': display}
+                         for concept_id, display, total in rows],
+        },
+    }
+
+
+def get_batch_request(request, entry):
+    """
+    Returns (value set operation, parameters) of $validate-code batch entry. Display language of the batch
+    request applies to entries not giving their own.
+    """
+    if not isinstance(entry, dict) or not isinstance(entry.get('request', {}), dict):
+        raise FHIRError("Bundle entry has to be an object with request object.")
+    entry_url = entry.get('request', {}).get('url', '')
+    if not isinstance(entry_url, str):
+        raise FHIRError("Bundle entry request url has to be a string.")
+
+    path, _, query = entry_url.partition('?')
+    operation = path.lstrip('/')
+    if operation not in ('CodeSystem/$validate-code', 'ValueSet/$validate-code'):
+        raise FHIRError("Only $validate-code operations are supported in batch.", code='not-supported')
+
+    entry_parameters = QueryDict(query).dict()
+    resource = entry.get('resource', {})
+    if not isinstance(resource, dict):
+        raise FHIRError("Bundle entry resource has to be an object.")
+    if resource.get('resourceType') == 'Parameters':
+        entry_parameters.update(parse_parameters(resource))
+    if 'displayLanguage' in request.GET:
+        entry_parameters.setdefault('displayLanguage', request.GET['displayLanguage'])
+    return operation == 'ValueSet/$validate-code', entry_parameters
+
+
+@fhir_operation
+def batch(request, parameters):
+    if parameters.get('resourceType') != 'Bundle' or parameters.get('type') != 'batch':
+        raise FHIRError("Only batch Bundle is accepted.")
+
+    entries = parameters.get('entry', [])
+    if not isinstance(entries, list):
+        raise FHIRError("Bundle entry has to be a list.")
+
+    # Validations are grouped by display language, each group is resolved by set based queries
+    requests, validations = [], {}
+    for entry in entries:
+        try:
+            value_set, entry_parameters = get_batch_request(request, entry)
+            code, url = get_validation(entry_parameters, value_set)
+        except FHIRError as e:
+            requests.append(e)
+            continue
+        lang = get_lang(entry_parameters)
+        group = validations.setdefault(lang, [])
+        requests.append((lang, len(group)))
+        group.append((code, url))
+
+    results = dict((lang, validate_codes(group, lang)) for lang, group in validations.items())
+
+    response_entries = []
+    for entry_request in requests:
+        if isinstance(entry_request, FHIRError):
+            response_entries.append({'resource': operation_outcome(str(entry_request), entry_request.code),
+                                     'response': {'status': str(entry_request.status)}})
+        else:
+            lang, index = entry_request
+            response_entries.append({'resource': validate_code_parameters(*results[lang][index]),
+                                     'response': {'status': '200'}})
+
+    return {'resourceType': 'Bundle', 'type': 'batch-response', 'entry': response_entries}